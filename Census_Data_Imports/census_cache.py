@@ -0,0 +1,115 @@
+# Census API Response Cache
+
+# This Python file stores a simple on-disk cache for Census API results.
+# ACS releases don't change once they have been published, so there's
+# no need to download the same tables again every time a script gets
+# rerun. Cached results are saved as Parquet files (which requires the
+# pyarrow library) so that they can be read back in quickly.
+
+import os
+import json
+import time
+import hashlib
+import threading
+import pandas as pd
+
+class CensusCache:
+    '''This class saves parsed Census API results to a local folder and
+    then returns them in place of new API calls.
+
+    cache_folder: the folder in which cached results will be stored.
+    (It will get created if it doesn't exist already.)
+
+    ttl_days: the number of days for which cached results will remain
+    valid. Set to None (the default) to keep results indefinitely, which
+    works well for published ACS releases.
+
+    max_size_mb: the maximum size of the cache folder in megabytes.
+    Once this size is exceeded, the least recently used results will
+    get deleted. Set to None to disable this limit.
+
+    offline_only: set to True to prevent any API calls from being made.
+    In this case, a ValueError will be raised for any result that isn't
+    already present within the cache.
+    '''
+
+    def __init__(self, cache_folder='census_cache', ttl_days=None,
+                 max_size_mb=None, offline_only=False):
+        self.cache_folder = cache_folder
+        self.ttl_days = ttl_days
+        self.max_size_mb = max_size_mb
+        self.offline_only = offline_only
+        # retrieve_census_data() may read from and write to the cache
+        # within multiple threads, so a lock is used to keep the
+        # eviction step from running within two threads at once.
+        self.lock = threading.Lock()
+        os.makedirs(cache_folder, exist_ok=True)
+
+    def create_key(self, **key_components):
+        '''This function converts a set of keyword arguments (e.g. year,
+        survey, region, variables, and geography filter) into a
+        content-based hash that can serve as a file name. Identical
+        requests will always map to the same key.'''
+        # Sorting the keys and converting all values to strings
+        # ensures that the same components will always produce the
+        # same JSON string (and thus the same hash).
+        key_string = json.dumps(key_components, sort_keys=True,
+                                default=str)
+        return hashlib.sha256(key_string.encode('utf-8')).hexdigest()
+
+    def create_path(self, key):
+        return os.path.join(self.cache_folder, f'{key}.parquet')
+
+    def get(self, key):
+        '''Returns the DataFrame stored under key, or None if no valid
+        copy of that DataFrame exists. (If offline_only is True, a
+        ValueError will be raised instead of returning None.)'''
+        path = self.create_path(key)
+        if os.path.exists(path):
+            # Each file's modification time reflects the time at which
+            # it was written to the cache, so it can be used to check
+            # whether the file has expired.
+            written_time = os.path.getmtime(path)
+            if ((self.ttl_days is None) or
+                (time.time() - written_time < self.ttl_days * 86400)):
+                df = pd.read_parquet(path)
+                # Updating the file's access time (but not its
+                # modification time) so that the least-recently-used
+                # eviction code below will treat it as recently used:
+                os.utime(path, (time.time(), written_time))
+                return df
+        if self.offline_only == True:
+            raise ValueError(f"No cached result was found for key {key}, \
+and offline_only is set to True.")
+        return None
+
+    def put(self, key, df):
+        '''Saves df to the cache under key, then removes older results
+        if the cache has grown past max_size_mb.'''
+        path = self.create_path(key)
+        # Writing to a temporary file first, then renaming it, prevents
+        # other scripts from reading a partially written file.
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        df.to_parquet(temp_path)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def evict(self):
+        '''Deletes the least recently used files within the cache until
+        its total size is no greater than max_size_mb.'''
+        if self.max_size_mb is None:
+            return
+        with self.lock:
+            file_stats = []
+            for file_name in os.listdir(self.cache_folder):
+                if file_name.endswith('.parquet'):
+                    path = os.path.join(self.cache_folder, file_name)
+                    file_stats.append((path, os.stat(path)))
+            total_size = sum(stats.st_size for path, stats in file_stats)
+            # Sorting files from least to most recently accessed:
+            file_stats.sort(key=lambda item: item[1].st_atime)
+            for path, stats in file_stats:
+                if total_size <= self.max_size_mb * 1024 * 1024:
+                    break
+                os.remove(path)
+                total_size -= stats.st_size
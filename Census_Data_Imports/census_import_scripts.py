@@ -5,10 +5,25 @@
 # using the Census API to download data; and adding certain statistical
 # fields to tables.
 
+# (If a CensusCache object (defined within census_cache.py) is passed
+# to these functions, API results will get saved locally and then reused
+# in place of new API calls.)
+
+import os
+import json
+import time
+import random
+import codecs
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+import requests
+import numpy as np
 import pandas as pd
 from iteration_utilities import duplicates
+from census_cache import CensusCache
 
-def download_variable_list(year, survey):
+def download_variable_list(year, survey, cache=None, catalog=None):
     '''This function imports a list of all variables from the Census
     website, thus allowing variable codes to get mapped to names in 
     subsequent analyses.
@@ -18,30 +33,51 @@ def download_variable_list(year, survey):
     survey: the ACS type for which to retrieve variables (e.g.
     'acs5' or 'acs1' for the 5-year and 1-year ACS estimates,
     respectively.)
+
+    cache: an optional CensusCache object. If one is provided, the
+    variable list will only get downloaded if it isn't already present
+    within the cache.
+
+    catalog: an optional VariableCatalog object (defined within
+    variable_catalog.py) to which these variables will get added.
+
+    The function also returns the variable table as a DataFrame.
     '''
-    
-    print(f"Importing {survey} variables from {year}.")
-    df_variables_page = pd.read_html(
-        f'https://api.census.gov/data/\
+
+    if cache is not None:
+        cache_key = cache.create_key(
+            year=year, survey=survey, table='variables')
+        df_variables = cache.get(cache_key)
+    else:
+        df_variables = None
+
+    if df_variables is None:
+        print(f"Importing {survey} variables from {year}.")
+        df_variables_page = pd.read_html(
+            f'https://api.census.gov/data/\
 {year}/acs/{survey}/variables.html')[0] 
-    # [0] selects the first HTML table found on this page.
-    # See https://pandas.pydata.org/pandas-docs/stable/reference/api/
-    # pandas.read_html.html
-    # for more information on pd.read_html().
+        # [0] selects the first HTML table found on this page.
+        # See https://pandas.pydata.org/pandas-docs/stable/reference/api/
+        # pandas.read_html.html
+        # for more information on pd.read_html().
+            
+        # Some rows in this table contain items other than demographic 
+        # variables (e.g. region names). We can exclude them by selecting 
+        # only rows that begin with 'Estimate'. (Another option would have 
+        # been to filter out rows with N/A 'Group' entries (i.e. 
+        # df_variables.query("Group.isna() == False")), 
+        # but this would have left a couple non-variable rows in place.
         
-    # Some rows in this table contain items other than demographic 
-    # variables (e.g. region names). We can exclude them by selecting 
-    # only rows that begin with 'Estimate'. (Another option would have 
-    # been to filter out rows with N/A 'Group' entries (i.e. 
-    # df_variables.query("Group.isna() == False")), 
-    # but this would have left a couple non-variable rows in place.
-    
-    df_variables = df_variables_page[
-    df_variables_page['Label'].str[0:8] == 'Estimate'].copy(
-    ).reset_index(drop=True)
-    # Removing an extraneous column from our output
-    if 'Unnamed: 8' in df_variables.columns:
-        df_variables.drop('Unnamed: 8', axis=1, inplace=True)
+        df_variables = df_variables_page[
+        df_variables_page['Label'].str[0:8] == 'Estimate'].copy(
+        ).reset_index(drop=True)
+        # Removing an extraneous column from our output
+        if 'Unnamed: 8' in df_variables.columns:
+            df_variables.drop('Unnamed: 8', axis=1, inplace=True)
+        if cache is not None:
+            cache.put(cache_key, df_variables)
+    else:
+        print(f"Loaded {survey} variables from {year} from the cache.")
     # Saving this table to a local .csv file:
     df_variables.to_csv(f'Datasets/{survey}_{year}_variables.csv',
                        index=False) 
@@ -60,6 +96,12 @@ def download_variable_list(year, survey):
     df_groups.to_csv(f'Datasets/{survey}_{year}_groups.csv', 
                  index=False)    
     print(f"Finished saving variable and group tables to .csv files.")
+
+    if catalog is not None:
+        catalog.add_vintage(year, survey, df_variables)
+        print(f"Added {survey} variables from {year} to the catalog.")
+
+    return df_variables
     
 
 def create_variable_aliases(df_variables, variable_list):
@@ -70,6 +112,10 @@ def create_variable_aliases(df_variables, variable_list):
     This resulting dictionary can then be passed to a df.rename() call
     within retrieve_census_data() in order to make the output of that
     function easier to interpret.
+    (If you'll be creating aliases for many different variable lists,
+    consider using VariableCatalog.create_variable_aliases() (within
+    variable_catalog.py) instead, as it doesn't need to filter
+    df_variables for each call.)
     
     df_variables: A DataFrame containing a list of Census variables. For
     an example of this list for the 2021 American Community Survey (5-Year 
@@ -98,9 +144,525 @@ def create_variable_aliases(df_variables, variable_list):
     return alias_dict
 
 
+
+def create_variable_sublists(variable_list, sublist_size=45):
+    '''This function splits variable_list into sublists of up to
+    sublist_size variables, each of which can then be passed to a 
+    single Census API call. (See retrieve_census_data() for an 
+    explanation of the default sublist_size of 45.)'''
+    return [variable_list[i:i+sublist_size] 
+            for i in range(0, len(variable_list), sublist_size)]
+
+
+def create_api_url(year, survey_string, region, key, variable_sublist,
+                   in_clause=None):
+    '''This function creates the Census API URL for a given sublist
+    of variables.
+    
+    survey_string: the survey component of the URL (e.g. 'acs/acs5').
+
+    in_clause: an optional geographic filter to add to the URL's 'in' 
+    parameter (e.g. 'state:51' to retrieve only Virginia tracts, or
+    'state:51%20county:003' to retrieve only block groups within 
+    Albemarle County).
+    
+    The other arguments correspond to those found within
+    retrieve_census_data().'''
+    # Converting the list of variables into a string that can be 
+    # passed to the API call:
+    # (The Census API guide at
+    # https://www.census.gov/content/dam/Census/data/developers/
+    # api-user-guide/api-guide.pdf
+    # demonstrates how to call multiple census variables at once.)
+    get_string = ','.join(['NAME'] + variable_sublist)
+
+    # This URL was originally based on an example found in
+    # https://api.census.gov/data/2022/acs/acs5/examples.html .
+    api_url = f'https://api.census.gov/data/{year}/\
+{survey_string}?get={get_string}&for={region}:*'
+    if in_clause is not None:
+        api_url += f'&in={in_clause}'
+    return api_url + f'&key={key}'
+
+
+class RateLimiter:
+    '''This class spaces out API calls to each host so that no more
+    than requests_per_second calls will get sent to that host per
+    second, even when those calls are being made by multiple threads.
+    (If requests_per_second is None, calls won't be delayed.)'''
+
+    def __init__(self, requests_per_second=None):
+        self.requests_per_second = requests_per_second
+        self.lock = threading.Lock()
+        # This dictionary stores the earliest time at which the next
+        # call to each host can be made:
+        self.next_request_times = {}
+
+    def wait(self, url):
+        '''Pauses the current thread until a call to the host
+        within url is permitted.'''
+        if self.requests_per_second is None:
+            return
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            request_time = max(
+                now, self.next_request_times.get(host, now))
+            self.next_request_times[host] = (
+                request_time + 1 / self.requests_per_second)
+        # Sleeping outside of the lock allows other threads to reserve
+        # their own time slots in the meantime.
+        time.sleep(request_time - now)
+
+
+def iterate_response_rows(byte_chunks):
+    '''This generator function yields each row within a Census API
+    response (a JSON list of lists) as soon as that row has been
+    received, thus avoiding the need to store the entire response in
+    memory as a single string.
+
+    byte_chunks: an iterable of bytes objects (such as the output of
+    a requests Response's iter_content() method).'''
+    decoder = json.JSONDecoder()
+    # An incremental decoder ensures that multi-byte characters split
+    # across two chunks will still get decoded correctly.
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    outer_list_opened = False
+    outer_list_closed = False
+
+    for byte_chunk in byte_chunks:
+        buffer += text_decoder.decode(byte_chunk)
+        position = 0
+        while True:
+            # Skipping over whitespace and the commas between rows:
+            while (position < len(buffer) 
+                   and buffer[position] in ' \t\r\n,'):
+                position += 1
+            if position == len(buffer) or outer_list_closed:
+                break
+            if outer_list_opened == False:
+                if buffer[position] != '[':
+                    break # This error will get raised below.
+                outer_list_opened = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                outer_list_closed = True
+                position += 1
+                break
+            try:
+                row, position_after_row = decoder.raw_decode(
+                    buffer, position)
+            except json.JSONDecodeError: # The rest of this row hasn't
+                # been received yet, so the function will wait for the
+                # next chunk.
+                break
+            yield row
+            position = position_after_row
+        buffer = buffer[position:]
+
+    buffer += text_decoder.decode(b'', final=True)
+    if (outer_list_closed == False) or (len(buffer.strip()) > 0):
+        # The Census API returns plain-text error messages (e.g. for 
+        # unknown variables), so these will get displayed here.
+        raise ValueError(f"The Census API response could not be parsed. \
+Unparsed content: {buffer[:500]}")
+
+
+def convert_numeric_batch(values):
+    '''This function converts a sequence of numeric strings into an
+    int64 array if possible; a float64 array if some values are 
+    missing or non-integer; or, if neither conversion is possible, an
+    object array.'''
+    for dtype in ['int64', 'float64']:
+        try:
+            return np.array(values, dtype=dtype)
+        except (ValueError, TypeError):
+            pass
+    return np.array(values, dtype='object')
+
+
+def parse_census_response(byte_chunks, numeric_columns, batch_size=10000):
+    '''This function converts a Census API response into a DataFrame 
+    whose numeric columns are already stored as integers or floats and 
+    whose geographic columns are stored as categoricals. Rows are 
+    converted in batches of batch_size as they arrive, so the full 
+    response never needs to be stored as a table of strings.
+
+    byte_chunks: see iterate_response_rows().
+
+    numeric_columns: the columns that should be converted to numeric
+    values. (All other columns will be treated as geographic 
+    identifiers.)'''
+    rows = iterate_response_rows(byte_chunks)
+    # The first row contains the column names.
+    header = next(rows)
+    numeric_columns = set(numeric_columns)
+    column_arrays = [[] for column in header]
+    batch = []
+
+    def convert_batch():
+        # zip(*batch) transposes the list of rows into a list of 
+        # columns.
+        for i, values in enumerate(zip(*batch)):
+            if header[i] in numeric_columns:
+                column_arrays[i].append(convert_numeric_batch(values))
+            else:
+                column_arrays[i].append(np.array(values, dtype='object'))
+        batch.clear()
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            convert_batch()
+    if len(batch) > 0:
+        convert_batch()
+
+    data = {}
+    for column, arrays in zip(header, column_arrays):
+        if len(arrays) == 0: # I.e. the response contained no data rows
+            values = np.array([], dtype='object')
+        else:
+            # np.concatenate() will convert int64 batches to float64 if
+            # any other batch within the column contains floats.
+            values = np.concatenate(arrays)
+        if column in numeric_columns:
+            data[column] = values
+        else:
+            data[column] = pd.Categorical(values)
+
+    # Starting the index at 1 keeps it consistent with the earlier 
+    # version of this code, which removed the header row (row 0) from 
+    # its output.
+    return pd.DataFrame(data, index=pd.RangeIndex(
+        1, len(data[header[0]]) + 1))
+
+
+# The following HTTP status codes generally indicate temporary issues
+# (e.g. rate limiting or server overload); requests that fail with 
+# these codes will be retried.
+RETRYABLE_STATUS_CODES = [429, 500, 502, 503, 504]
+
+def is_retryable_error(error):
+    '''Returns True if error appears to be a temporary network or 
+    server issue (and False otherwise).'''
+    if isinstance(error, requests.HTTPError):
+        return ((error.response is not None) and 
+                (error.response.status_code in RETRYABLE_STATUS_CODES))
+    return isinstance(error, (
+        requests.ConnectionError, requests.Timeout, 
+        requests.exceptions.ChunkedEncodingError))
+
+
+def call_with_retries(function, max_retries=5, backoff_seconds=1):
+    '''This function calls function() and returns its output. If the
+    call fails due to a temporary error, it will be retried up to
+    max_retries times. The wait between attempts doubles after each
+    failure (1, 2, 4, 8... times backoff_seconds), and a random 'jitter'
+    component is applied to each wait so that multiple threads that 
+    failed at the same time won't all retry at the same moment.'''
+    for attempt in range(max_retries + 1):
+        try:
+            return function()
+        except Exception as error:
+            if (attempt == max_retries) or (
+                is_retryable_error(error) == False):
+                raise
+            # This 'full jitter' approach picks a random wait time
+            # between 0 and the current exponential backoff limit.
+            wait_time = random.uniform(
+                0, backoff_seconds * 2 ** attempt)
+            print(f"Retrying after error ({error}); waiting \
+{round(wait_time, 2)} seconds.")
+            time.sleep(wait_time)
+
+
+def resolve_checkpoint_cache(cache, checkpoint_folder):
+    '''Returns the CensusCache that will store each retrieved unit
+    (i.e. each year, variable sublist, and geography combination) as 
+    soon as it is retrieved. If checkpoint_folder is provided, a cache
+    that stores results within that folder will be returned; otherwise,
+    cache will be returned as is.'''
+    if checkpoint_folder is None:
+        return cache
+    if cache is not None:
+        raise ValueError("Please pass either a cache or a \
+checkpoint_folder, but not both. (A cache will also allow interrupted \
+retrievals to resume where they left off.)")
+    return CensusCache(checkpoint_folder)
+
+
+def retrieve_variable_sublist(api_url, rate_limiter=None, cache=None,
+                              cache_key=None, session=None, 
+                              max_retries=5, backoff_seconds=1):
+    '''This function retrieves the results of a single Census API
+    call as a DataFrame.
+
+    api_url: a URL created by create_api_url().
+
+    rate_limiter: an optional RateLimiter instance that will 
+    determine when this call can be made.
+
+    cache and cache_key: an optional CensusCache object and the key
+    under which this call's results are stored within it. (The API 
+    will only get called if these results aren't already cached.)
+
+    session: an optional requests Session (such as one created by 
+    create_session()) through which to make this call.
+
+    max_retries and backoff_seconds: see call_with_retries().'''
+    if cache is not None:
+        df_results = cache.get(cache_key)
+        if df_results is not None:
+            return df_results
+
+    if session is None:
+        session = requests
+
+    # All variables within the 'get' portion of the URL other than
+    # NAME will contain numeric data; the remaining columns (e.g. NAME,
+    # state, and county) are geographic identifiers.
+    get_columns = parse_qs(urlparse(api_url).query)['get'][0].split(',')
+    numeric_columns = [column for column in get_columns 
+                       if column != 'NAME']
+
+    def request_and_parse():
+        if rate_limiter is not None:
+            rate_limiter.wait(api_url)
+        # stream=True allows the response to be parsed as it arrives 
+        # rather than after the entire payload has been downloaded.
+        # (The with block ensures that the connection will be released
+        # back to the session's pool even if the request or parsing 
+        # fails.)
+        with session.get(api_url, stream=True) as response:
+            response.raise_for_status()
+            # (Parsing takes place within this function so that a 
+            # connection that drops partway through the response will
+            # also get retried.)
+            return parse_census_response(
+                response.iter_content(chunk_size=65536), 
+                numeric_columns=numeric_columns)
+
+    df_results = call_with_retries(
+        request_and_parse, max_retries=max_retries, 
+        backoff_seconds=backoff_seconds)
+
+    if cache is not None:
+        cache.put(cache_key, df_results)
+    return df_results
+
+
+def combine_sublist_results(results_list, merge_keys):
+    '''This function combines the DataFrames retrieved for each
+    variable sublist into a single table.
+    
+    results_list: a list of DataFrames returned by
+    retrieve_variable_sublist().
+
+    merge_keys: the geographic identifier columns that all of these
+    DataFrames have in common.'''
+    if len(results_list) == 1:
+        return results_list[0].copy()
+
+    # Rather than merging each set of results into a combined table
+    # one at a time (which would require N-1 merges and copies), the 
+    # function joins all of them together at once by using their
+    # geographic identifiers as an index. 
+    # Sorting the index reproduces the lexicographic row order that 
+    # an outer merge would have created.
+    df_combined_results = pd.concat(
+        [df_results.set_index(merge_keys) 
+         for df_results in results_list], 
+        axis=1, join='outer').sort_index().reset_index()
+    return df_combined_results
+
+
+def convert_survey_and_region(survey, region):
+    '''This function converts the survey and region arguments passed
+    to retrieve_census_data() into the strings that the Census API 
+    expects; it returns both of these strings. (See 
+    retrieve_census_data() for more details on these arguments.)'''
+    if survey == 'acs5':
+        survey_string = 'acs/acs5'
+
+    elif survey == 'acs1':
+        survey_string = 'acs/acs1'
+    
+    else:
+        raise ValueError("This survey type is not currently supported by \
+                         the function.")
+
+    
+    # Converting simplified region names into strings that the Census API 
+    # will recognize:
+    if region == 'zip':
+        region = 'zip%20code%20tabulation%20area' # Based on
+        # the ZCTA example within
+        # https://api.census.gov/data/2021/acs/acs5/examples.html
+    
+    if region == 'csa':
+        region = 'combined%20statistical%20area'
+    
+    if region == 'msa':
+        region = 'metropolitan%20statistical\
+%20area/micropolitan%20statistical%20area'
+
+    if region == 'block group':
+        region = 'block%20group'
+
+    return survey_string, region
+
+
+def create_cache_keys(cache, year, survey, region, variable_sublists,
+                      in_clause=None):
+    '''This function creates a cache key for each variable sublist
+    (or a list of None values if cache is None).'''
+    if cache is None:
+        return [None] * len(variable_sublists)
+    geography_filter = f'for={region}:*'
+    if in_clause is not None:
+        geography_filter += f'&in={in_clause}'
+    return [cache.create_key(
+        year=year, survey=survey, region=region, 
+        variables=variable_sublist, 
+        geography_filter=geography_filter)
+            for variable_sublist in variable_sublists]
+
+
+def create_session(max_workers=1):
+    '''This function creates a requests Session whose connection pool
+    is large enough for max_workers threads. Reusing a single session 
+    across API calls avoids setting up a new HTTPS connection to the 
+    Census's servers for every sublist.'''
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1, pool_maxsize=max(max_workers, 1))
+    session.mount('https://', adapter)
+    return session
+
+
+def retrieve_sublists(api_urls, cache_keys, max_workers=1,
+                      requests_per_second=None, cache=None, 
+                      session=None, rate_limiter=None, max_retries=5,
+                      backoff_seconds=1):
+    '''This function retrieves the results for each URL within 
+    api_urls, returning them as a list of DataFrames in the same order.
+    (See retrieve_census_data() for explanations of the other 
+    arguments. If a RateLimiter object is passed to rate_limiter, it 
+    will be used in place of requests_per_second.)
+
+    If a cache is provided, each sublist's results will get saved to it
+    as soon as they are retrieved. Therefore, if one sublist fails, the
+    sublists that were already retrieved won't need to be requested 
+    again when the function is rerun.'''
+    if rate_limiter is None:
+        rate_limiter = RateLimiter(
+            requests_per_second=requests_per_second)
+    if session is None:
+        session = create_session(max_workers)
+
+    if max_workers > 1: # In this case, multiple sublists will get
+        # requested at the same time. (Most of the time spent on each
+        # call is simply spent waiting for the Census's servers to 
+        # respond, so threads work well here.) executor.map() returns
+        # its results in the same order as api_urls, so the output
+        # will match that of the sequential approach.
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results_list = list(executor.map(
+                lambda api_url, cache_key: retrieve_variable_sublist(
+                    api_url, rate_limiter=rate_limiter, cache=cache,
+                    cache_key=cache_key, session=session,
+                    max_retries=max_retries, 
+                    backoff_seconds=backoff_seconds), 
+                api_urls, cache_keys))
+    else:
+        results_list = [retrieve_variable_sublist(
+            api_url, rate_limiter=rate_limiter, cache=cache,
+            cache_key=cache_key, session=session, 
+            max_retries=max_retries, backoff_seconds=backoff_seconds) 
+                        for api_url, cache_key in zip(
+                            api_urls, cache_keys)]
+
+    return results_list
+
+
+def finalize_census_results(results_list, variable_sublists, 
+                            variable_list, year, rename_data_fields=False,
+                            field_vars_dict={}):
+    '''This function combines the results retrieved for each variable
+    sublist into a single DataFrame; converts variable columns to 
+    numeric values; renames them (if requested); and adds a 'Year'
+    column. (See retrieve_census_data() for explanations of these 
+    arguments.)'''
+
+    # Determining which merge keys to use when combining API results
+    # for different sublists together:
+    # This is made more complicated by the fact that results for 
+    # different regions will have different identifier
+    # columns (e.g. 'NAME', 'county', and 'state' for county data but 
+    # only 'NAME' and 'state' for state data). However, we can 
+    # accommodate this behavior by simply initializing our list of 
+    # merge keys as the set of all columns that are *not* also 
+    # variable columns. (This step only needs to be performed for our 
+    # first sublist of variables, since merge keys for other sublists
+    # will be identical.)
+    merge_keys = list(set(results_list[0].columns) 
+      - set(variable_sublists[0]))
+    # print("merge_keys:",merge_keys)
+
+    df_combined_results = combine_sublist_results(
+        results_list, merge_keys)
+
+    # Converting variable columns to numeric data types:
+    # (parse_census_response() will already have converted most of
+    # these columns, so only those still stored as text (e.g. within
+    # results cached by earlier versions of this script) will need to
+    # be converted here.)
+    for column in variable_list:
+        if pd.api.types.is_numeric_dtype(df_combined_results[column]):
+            continue
+        # print(f"Now converting {column} to a numeric type.")
+        df_combined_results[column] = pd.to_numeric(
+            df_combined_results[column])
+        # pd.to_numeric() allows for either integer or float outputs
+        # depending on the nature of the original data.
+        # See https://pandas.pydata.org/pandas-docs/stable/reference/api/
+        # pandas.to_numeric.html
+
+    # Replacing column names with aliases if requested:
+    if rename_data_fields == True:
+        df_combined_results.rename(
+            columns=field_vars_dict, inplace=True)
+
+    # The following for loop moves all of the merge keys (e.g. geographic
+    # identifiers) to the left side of the table. This is particularly
+    # useful when retrieving longer lists of variables, as otherwise,
+    # certain keys can get buried in the middle of the dataset.
+
+    # I think I got the idea of chaining .insert() and .pop() together
+    # from a StackOverflow answer like this one from Marc Maxmeister : 
+    # https://stackoverflow.com/a/77463008/13097194 )
+    
+    for i in range(len(merge_keys)):
+        df_combined_results.insert(
+            i, merge_keys[i], 
+            df_combined_results.pop(merge_keys[i]))
+
+    # Adding a 'Year' column to the left of all existing DataFrame columns:
+    # (this will prove particularly
+    # helpful when comparing data from different years.)
+    df_combined_results.insert(0, 'Year', year)
+    
+    return df_combined_results
+
+
 def retrieve_census_data(survey, year, region, key, variable_list,
                          rename_data_fields=False, 
-                         field_vars_dict={}):
+                         field_vars_dict={}, max_workers=1,
+                         requests_per_second=None, cache=None,
+                         session=None, max_retries=5, backoff_seconds=1,
+                         checkpoint_folder=None):
     '''This function retrieves data from the US
     Census API. 
     
@@ -150,6 +712,39 @@ def retrieve_census_data(survey, year, region, key, variable_list,
      'B01001_002E': 'Sex by Age_Estimate!!Total:!!Male:_B01001_002E'}'.
     I suggest that you use the output of a create_variable_aliases() call
     as the argument for this parameter.
+
+    max_workers: the number of variable sublists to request from the
+    Census API at the same time. The default of 1 retrieves these 
+    sublists one after another; higher values can greatly reduce the 
+    time needed to retrieve several hundred variables.
+
+    requests_per_second: the maximum number of API calls to send to 
+    the Census's servers per second. (This is mainly useful when 
+    max_workers is greater than 1.) Set to None to disable this limit.
+
+    cache: an optional CensusCache object. Results for each variable
+    sublist will get read from this cache when available and added to
+    it otherwise. (Your API key is not included within cache keys.)
+
+    session: an optional requests Session to use for all API calls.
+    (If none is provided, one will be created via create_session().)
+
+    max_retries: the number of times to retry an API call that failed
+    due to a temporary error (such as a 503 response or a dropped
+    connection).
+
+    backoff_seconds: the initial wait time (in seconds) before retrying
+    a failed call. This wait will double after each failure. (See
+    call_with_retries() for more details.)
+
+    checkpoint_folder: an optional folder in which each variable 
+    sublist's results will be saved as soon as they're retrieved. If 
+    the function gets interrupted (e.g. by an error that persists
+    after all retries), rerunning it with the same checkpoint_folder
+    will skip any sublists that were already retrieved. (You can
+    delete this folder once the retrieval has finished. Note that a 
+    cache provides the same functionality, so this argument can't be
+    used alongside one.)
      
     '''
 
@@ -164,32 +759,9 @@ def retrieve_census_data(survey, year, region, key, variable_list,
         raise ValueError(f"The following variables appear more than once \
 in your variable list: {duplicate_variables}")
     
-    if survey == 'acs5':
-        survey_string = 'acs/acs5'
-
-    elif survey == 'acs1':
-        survey_string = 'acs/acs1'
-    
-    else:
-        raise ValueError("This survey type is not currently supported by \
-                         the function.")
-
-    
-    # Converting simplified region names into strings that the Census API 
-    # will recognize:
-    if region == 'zip':
-        region = 'zip%20code%20tabulation%20area' # Based on
-        # the ZCTA example within
-        # https://api.census.gov/data/2021/acs/acs5/examples.html
-    
-    if region == 'csa':
-        region = 'combined%20statistical%20area'
-    
-    if region == 'msa':
-        region = 'metropolitan%20statistical\
-%20area/micropolitan%20statistical%20area'
+    survey_string, region = convert_survey_and_region(survey, region)
+    cache = resolve_checkpoint_cache(cache, checkpoint_folder)
 
-    
     # Only 50 variables can be retrieved from the Census API at a time 
     # using the approach shown in this function. The following code 
     # accommodates this limitation by splitting variable_list into 
@@ -199,113 +771,300 @@ in your variable list: {duplicate_variables}")
     # geographic variables, such as 'NAME', also appear to count toward
     # the 50-variable limit--and more than one geographic variable
     # may be present depending on which region type was selected.)
-    
-    i = 0
-       
-    while i < len(variable_list): # i.e. while there
-        # are still more variables to iterate through
-        variable_sublist = variable_list[i:i+45] # This line reads the 
-        # next 45 variables from variable_list into a sublist that can 
-        # then be\ passed to the API
-        # print("variable_sublist:", variable_sublist)
-        # Converting the list of variables into a string that can be 
-        # passed to the API call:
-        # (The Census API guide at
-        # https://www.census.gov/content/dam/Census/data/developers/
-        # api-user-guide/api-guide.pdf
-        # demonstrates how to call multiple census variables at once.)
-        variable_string = ','.join(variable_sublist)
-        # print("variable_string:",variable_string)
-    
-        # Retrieving data via the Census API:
-        # This line was originally based on an example found in
-        # https://api.census.gov/data/2022/acs/acs5/examples.html .
-    
-        # read_json documentation:
-        # https://pandas.pydata.org/pandas-docs/stable/reference/api/
-        # pandas.read_json.html
+    variable_sublists = create_variable_sublists(variable_list)
 
-        api_url = f'https://api.census.gov/data/{year}/\
-{survey_string}?get=NAME,{variable_string}&for={region}:*&key={key}'
-        # print(api_url)
-        
-        df_results = pd.read_json(api_url)
-    
-        # At this point, the DataFrame's columns are a list of integers; 
-        # the desired column names are stored within the first row. 
-        # The following code resolves this issue by setting these row 
-        # values as the column values and then deleting this row.
-    
-        df_results.columns = df_results.iloc[0]
-        df_results.drop(0, inplace=True)
-
-
-        # Determining which merge keys to use when combining API results
-        # for different sublists together:
-        # This is made more complicated by the fact that results for 
-        # different regions will have different identifier
-        # columns (e.g. 'NAME', 'county', and 'state' for county data but 
-        # only 'NAME' and 'state' for state data). However, we can 
-        # accommodate this behavior by simply initializing our list of 
-        # merge keys as the set of all columns that are *not* also 
-        # variable columns.
-        if i == 0: # This step only needs to be performed for our first
-            # sublist of variables, since merge keys for other sublists
-            # will be identical.
-            merge_keys = list(set(df_results.columns) 
-              - set(variable_sublist))
-            # print("merge_keys:",merge_keys)
-
-        if i == 0: # Since this is the first set 
-            # of results, we can initialize df_combined_results 
-            # as a copy of df_results.
-            df_combined_results = df_results.copy()
-        else: # Merging our latest set of results into df_results:
-            df_combined_results = df_combined_results.merge(
-                df_results, on=merge_keys,
-                how='outer').copy()
-            # Added .copy() here in response to a data fragmentation 
-        # warning
-
-        i += 45 # Allows the function to iterate through the next 
-        # 45 variables within variable_list
+    # Creating an API URL and (if a cache was provided) a cache key for
+    # each of these sublists:
+    api_urls = [create_api_url(
+        year=year, survey_string=survey_string, region=region,
+        key=key, variable_sublist=variable_sublist)
+                for variable_sublist in variable_sublists]
+    cache_keys = create_cache_keys(
+        cache=cache, year=year, survey=survey, region=region, 
+        variable_sublists=variable_sublists)
 
-        
-    # Converting variable columns to numeric data types:
-    for column in variable_list:
-        # print(f"Now converting {column} to a numeric type.")
-        df_combined_results[column] = pd.to_numeric(
-            df_combined_results[column])
-        # pd.to_numeric() allows for either integer or float outputs
-        # depending on the nature of the original data.
-        # See https://pandas.pydata.org/pandas-docs/stable/reference/api/
-        # pandas.to_numeric.html
+    results_list = retrieve_sublists(
+        api_urls=api_urls, cache_keys=cache_keys, 
+        max_workers=max_workers, 
+        requests_per_second=requests_per_second, cache=cache, 
+        session=session, max_retries=max_retries, 
+        backoff_seconds=backoff_seconds)
 
-    # Replacing column names with aliases if requested:
+    return finalize_census_results(
+        results_list=results_list, variable_sublists=variable_sublists,
+        variable_list=variable_list, year=year, 
+        rename_data_fields=rename_data_fields, 
+        field_vars_dict=field_vars_dict)
+
+
+def retrieve_census_panel(survey, years, region, key, variable_list,
+                          rename_data_fields=False, field_vars_dict={},
+                          output_format='long', field_year_separator='_',
+                          max_workers=4, requests_per_second=None,
+                          cache=None, session=None, max_retries=5,
+                          backoff_seconds=1, checkpoint_folder=None):
+    '''This function retrieves data for multiple years from the US 
+    Census API, then combines it into a single DataFrame. All variable
+    sublists for all years are requested within the same thread pool, 
+    cache, and session, so this function will generally be much faster
+    than calling retrieve_census_data() for each year in turn.
+
+    years: a list of the years for which to retrieve data (e.g. 
+    [2011, 2016, 2021]).
+
+    output_format: set to 'long' to return one row per region per year
+    (as would be the case if you concatenated the output of several
+    retrieve_census_data() calls together). Set to 'wide' to instead 
+    return one row per region, with fields named using the
+    {field_var}{field_year_separator}{year} format (e.g. 
+    'Total_Pop_2021'). Regions are matched across years via their
+    geographic codes, and each region's NAME value is taken from the
+    latest year. This wide format can be passed directly to
+    create_comparison_fields().
+
+    field_year_separator: the separator to place between variable names
+    and years when output_format is 'wide'.
+
+    All other arguments correspond to those found within 
+    retrieve_census_data().
+    '''
+    if output_format not in ['long', 'wide']:
+        raise ValueError("output_format must be either 'long' or 'wide'.")
+
+    duplicate_variables = list(duplicates(variable_list))
+    if len(duplicate_variables) > 0:
+        raise ValueError(f"The following variables appear more than once \
+in your variable list: {duplicate_variables}")
+
+    survey_string, region = convert_survey_and_region(survey, region)
+    cache = resolve_checkpoint_cache(cache, checkpoint_folder)
+    variable_sublists = create_variable_sublists(variable_list)
+
+    # Creating a single list of URLs (and cache keys) that covers all
+    # years so that they can all be retrieved within the same pool:
+    api_urls = []
+    cache_keys = []
+    for year in years:
+        api_urls += [create_api_url(
+            year=year, survey_string=survey_string, region=region,
+            key=key, variable_sublist=variable_sublist)
+                    for variable_sublist in variable_sublists]
+        cache_keys += create_cache_keys(
+            cache=cache, year=year, survey=survey, region=region,
+            variable_sublists=variable_sublists)
+
+    results_list = retrieve_sublists(
+        api_urls=api_urls, cache_keys=cache_keys, 
+        max_workers=max_workers, 
+        requests_per_second=requests_per_second, cache=cache, 
+        session=session, max_retries=max_retries, 
+        backoff_seconds=backoff_seconds)
+
+    # Splitting these results back into year-specific lists, then 
+    # combining each year's results into a single DataFrame:
+    sublist_count = len(variable_sublists)
+    df_list = [finalize_census_results(
+        results_list=results_list[
+            i*sublist_count:(i+1)*sublist_count], 
+        variable_sublists=variable_sublists, 
+        variable_list=variable_list, year=year, 
+        rename_data_fields=rename_data_fields, 
+        field_vars_dict=field_vars_dict) 
+               for i, year in enumerate(years)]
+
+    df_panel = pd.concat(df_list, ignore_index=True)
+
+    if output_format == 'long':
+        return df_panel
+
+    # Pivoting the data so that each region's values for each year
+    # will appear within the same row:
     if rename_data_fields == True:
-        df_combined_results.rename(
-            columns=field_vars_dict, inplace=True)
+        field_vars = [field_vars_dict.get(variable, variable) 
+                      for variable in variable_list]
+    else:
+        field_vars = variable_list
+    id_cols = [column for column in df_panel.columns 
+               if column not in field_vars + ['Year']]
+    # Only geographic codes (e.g. 'state' and 'county') are used to 
+    # match regions across years. (Regions' names can change from one
+    # year to the next--e.g. when a county is renamed--so including 
+    # 'NAME' would split these regions across multiple rows.)
+    index_cols = [column for column in id_cols if column != 'NAME']
+    df_panel_wide = df_panel.pivot(
+        columns='Year', index=index_cols, values=field_vars)
+    # Flattening the resulting MultiIndex columns into 
+    # {field_var}{field_year_separator}{year} format:
+    df_panel_wide.columns = [
+        f'{field_var}{field_year_separator}{year}' 
+        for field_var, year in df_panel_wide.columns]
+    df_panel_wide = df_panel_wide.reset_index()
+    if 'NAME' in id_cols:
+        # Adding each region's name as of the latest year for which 
+        # data was retrieved:
+        df_names = df_panel.sort_values(
+            'Year', kind='stable').drop_duplicates(
+                subset=index_cols, keep='last')[index_cols + ['NAME']]
+        df_panel_wide = df_panel_wide.merge(
+            df_names, on=index_cols, how='left')
+    return df_panel_wide[
+        id_cols + [column for column in df_panel_wide.columns 
+                   if column not in id_cols]]
 
-    # The following for loop moves all of the merge keys (e.g. geographic
-    # identifiers) to the left side of the table. This is particularly
-    # useful when retrieving longer lists of variables, as otherwise,
-    # certain keys can get buried in the middle of the dataset.
+def retrieve_shard_codes(year, survey_string, key, shard_by, 
+                         state_codes=None, session=None, max_retries=5,
+                         backoff_seconds=1, cache=None, 
+                         rate_limiter=None):
+    '''This function returns a list of 'in' clauses (e.g. 'state:01' 
+    or 'state:01%20county:001') that together cover the entire US (or
+    the states within state_codes, if provided).
 
-    # I think I got the idea of chaining .insert() and .pop() together
-    # from a StackOverflow answer like this one from Marc Maxmeister : 
-    # https://stackoverflow.com/a/77463008/13097194 )
-    
-    for i in range(len(merge_keys)):
-        df_combined_results.insert(
-            i, merge_keys[i], 
-            df_combined_results.pop(merge_keys[i]))
+    shard_by: 'state' or 'county'.
+
+    state_codes: an optional list of two-digit state FIPS codes (e.g. 
+    ['51', '24']) to which the shards should be limited.
+
+    cache: an optional CensusCache object. The list of states or 
+    counties will only get retrieved from the API if it isn't already
+    present within this cache. (This allows sharded retrievals to be
+    replayed from a cache whose offline_only setting is True.)
+
+    rate_limiter: an optional RateLimiter instance that will determine
+    when the API call for this list can be made.'''
+    if shard_by == 'state' and state_codes is not None:
+        return [f'state:{state_code}' for state_code in state_codes]
+
+    # Retrieving a list of all states or counties from the API (or 
+    # from the cache):
+    api_url = create_api_url(
+        year=year, survey_string=survey_string, region=shard_by,
+        key=key, variable_sublist=[])
+    if cache is not None:
+        cache_key = cache.create_key(
+            year=year, survey=survey_string, region=shard_by, 
+            table='shard codes')
+    else:
+        cache_key = None
+    df_codes = retrieve_variable_sublist(
+        api_url, rate_limiter=rate_limiter, cache=cache, 
+        cache_key=cache_key, session=session, max_retries=max_retries,
+        backoff_seconds=backoff_seconds)
+    if state_codes is not None:
+        df_codes = df_codes[df_codes['state'].isin(state_codes)]
+    df_codes = df_codes.sort_values(
+        ['state', 'county'] if shard_by == 'county' else ['state'])
+
+    if shard_by == 'state':
+        return [f'state:{state_code}' for state_code in df_codes['state']]
+    return [f'state:{state_code}%20county:{county_code}' 
+            for state_code, county_code 
+            in zip(df_codes['state'], df_codes['county'])]
+
+
+def retrieve_census_data_sharded(survey, year, region, key, variable_list,
+                                 shard_by='state', state_codes=None,
+                                 output_folder=None,
+                                 rename_data_fields=False, 
+                                 field_vars_dict={}, max_workers=8,
+                                 requests_per_second=None, cache=None,
+                                 session=None, max_retries=5,
+                                 backoff_seconds=1, 
+                                 checkpoint_folder=None):
+    '''This function retrieves data for small geographies (such as
+    tracts and block groups) by splitting the request into separate
+    'shards' for each state (or each county), then retrieving these 
+    shards concurrently. (The Census API requires an 'in' clause for 
+    these geographies, so retrieve_census_data() can't retrieve them 
+    for the entire country at once.)
+
+    region: the geographic level at which to retrieve data (e.g. 
+    'tract' or 'block group').
+
+    shard_by: 'state' to create one request per state, or 'county' 
+    to create one request per county. (Block group data must be 
+    sharded by county.)
+
+    state_codes: an optional list of two-digit state FIPS codes
+    (e.g. ['51']) to which the retrieval should be limited. If this is
+    None, data for all states will be retrieved.
+
+    output_folder: if a folder is provided, each shard will get saved
+    to its own Parquet file within this folder (e.g. 
+    'state_51.parquet' or 'state_51/county_003.parquet') as soon as it 
+    has been retrieved, and the function will return a list of these 
+    files' paths. The full dataset can then be read via 
+    pd.read_parquet(output_folder). This approach allows datasets 
+    too large to store in memory to be retrieved. If output_folder is
+    None, the function will instead return all shards as a single 
+    DataFrame.
+
+    All other arguments correspond to those found within 
+    retrieve_census_data(). (Note that max_workers refers to the 
+    number of shards that will be retrieved at once.)
+    '''
+    if shard_by not in ['state', 'county']:
+        raise ValueError("shard_by must be either 'state' or 'county'.")
+
+    duplicate_variables = list(duplicates(variable_list))
+    if len(duplicate_variables) > 0:
+        raise ValueError(f"The following variables appear more than once \
+in your variable list: {duplicate_variables}")
+
+    survey_string, region = convert_survey_and_region(survey, region)
+    cache = resolve_checkpoint_cache(cache, checkpoint_folder)
+    variable_sublists = create_variable_sublists(variable_list)
+    if session is None:
+        session = create_session(max_workers)
+    # A single rate limiter is shared by all shards so that the overall
+    # request rate won't exceed requests_per_second.
+    rate_limiter = RateLimiter(requests_per_second=requests_per_second)
+
+    in_clauses = retrieve_shard_codes(
+        year=year, survey_string=survey_string, key=key, 
+        shard_by=shard_by, state_codes=state_codes, session=session,
+        max_retries=max_retries, backoff_seconds=backoff_seconds,
+        cache=cache, rate_limiter=rate_limiter)
+
+    def retrieve_shard(in_clause):
+        # Retrieving all variable sublists for this shard:
+        api_urls = [create_api_url(
+            year=year, survey_string=survey_string, region=region,
+            key=key, variable_sublist=variable_sublist, 
+            in_clause=in_clause)
+                    for variable_sublist in variable_sublists]
+        cache_keys = create_cache_keys(
+            cache=cache, year=year, survey=survey, region=region,
+            variable_sublists=variable_sublists, in_clause=in_clause)
+        results_list = retrieve_sublists(
+            api_urls=api_urls, cache_keys=cache_keys, cache=cache, 
+            session=session, rate_limiter=rate_limiter, 
+            max_retries=max_retries, backoff_seconds=backoff_seconds)
+        df_shard = finalize_census_results(
+            results_list=results_list, 
+            variable_sublists=variable_sublists,
+            variable_list=variable_list, year=year, 
+            rename_data_fields=rename_data_fields, 
+            field_vars_dict=field_vars_dict)
+        if output_folder is None:
+            return df_shard
+
+        # Saving this shard to its own file (e.g. 'state_51.parquet'
+        # or 'state_51/county_003.parquet'):
+        path_components = [component.replace(':', '_') 
+                           for component in in_clause.split('%20')]
+        shard_path = os.path.join(
+            output_folder, *path_components) + '.parquet'
+        os.makedirs(os.path.dirname(shard_path), exist_ok=True)
+        df_shard.to_parquet(shard_path, index=False)
+        return shard_path
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        shard_results = list(executor.map(retrieve_shard, in_clauses))
+
+    if output_folder is not None:
+        return shard_results
+    return pd.concat(shard_results, ignore_index=True)
 
-    # Adding a 'Year' column to the left of all existing DataFrame columns:
-    # (this will prove particularly
-    # helpful when comparing data from different years.)
-    df_combined_results.insert(0, 'Year', year)
-    
-    return df_combined_results
 
 def create_comparison_fields(df, field_var, year_list,
                              field_year_separator='_'):
@@ -384,3 +1143,139 @@ def create_comparison_fields(df, field_var, year_list,
             100 * df[
             f'{year}-{latest_year} {field_var} % Change'].rank(
             pct=True, ascending=True, method='max'))
+
+
+def rank_columns(df, **rank_kwargs):
+    '''Ranks every column within df using the arguments in rank_kwargs
+    (e.g. ascending=False, method='min'). Columns with NumPy data types
+    are ranked via a single DataFrame-wide rank() call. However, 
+    DataFrame.rank() converts the ranks of nullable columns (e.g. those
+    with Int64 or Float64 data types) to float64 values, so these 
+    columns are ranked individually in order to preserve the data types
+    that Series.rank() would return.'''
+    numpy_cols = [column for column in df.columns 
+                  if isinstance(df[column].dtype, np.dtype)]
+    df_ranks = df[numpy_cols].rank(**rank_kwargs)
+    for column in df.columns:
+        if column not in numpy_cols:
+            df_ranks[column] = df[column].rank(**rank_kwargs)
+    return df_ranks[list(df.columns)]
+
+
+def create_comparison_fields_vectorized(df, field_vars, year_list,
+                                        field_year_separator='_'):
+    '''This function creates the same comparison fields as 
+    create_comparison_fields(), but it does so for multiple field_vars 
+    at once. Rather than adding each new column to df one at a time, 
+    it calculates all changes, percentage changes, ranks, and 
+    percentiles as 2-D arrays, then adds them to a copy of df via a 
+    single pd.concat() call. This avoids the DataFrame fragmentation
+    (and PerformanceWarnings) that can result from adding dozens of
+    columns to a table individually.
+
+    Note that, unlike create_comparison_fields(), this function returns
+    an updated copy of df rather than modifying df in place.
+
+    df: the DataFrame for which comparisons will be calculated.
+
+    field_vars: a list of the variables whose values should be compared
+    (e.g. ['Total_Pop', 'Total_Pop_25_to_29']). A single string is also
+    accepted.
+
+    year_list and field_year_separator: see create_comparison_fields().
+    '''
+    if isinstance(field_vars, str):
+        field_vars = [field_vars]
+
+    latest_year = year_list[-1]
+    earlier_years = year_list[:-1]
+
+    # Reading the latest year's values for each field_var into an array
+    # with one column per field_var, and the values for all earlier years
+    # into an array with one column per (field_var, year) pair:
+    # (The latest year's values are repeated so that they line up with
+    # the corresponding earlier-year columns.)
+    df_latest = df[[
+        f'{field_var}{field_year_separator}{latest_year}' 
+        for field_var in field_vars 
+        for year in earlier_years]]
+    df_earlier = df[[
+        f'{field_var}{field_year_separator}{year}' 
+        for field_var in field_vars 
+        for year in earlier_years]]
+    # (na_value=np.nan allows nullable columns, such as those with an
+    # Int64 data type, to be converted as well.)
+    latest_values = df_latest.to_numpy(dtype='float64', na_value=np.nan)
+    earlier_values = df_earlier.to_numpy(
+        dtype='float64', na_value=np.nan)
+    # Storing the data types that each nominal and percentage change 
+    # column would have had within create_comparison_fields() (e.g. 
+    # int64 and float64 if both years' columns contain integers, or 
+    # Int64 and Float64 if they contain nullable integers) so that 
+    # these types can be preserved. (These types are determined by
+    # performing the same calculations on empty copies of each 
+    # column.)
+    empty_latest = df_latest.iloc[:0]
+    empty_earlier = df_earlier.iloc[:0]
+    change_dtypes = [
+        (empty_latest.iloc[:, i] - empty_earlier.iloc[:, i]).dtype 
+        for i in range(empty_latest.shape[1])]
+    pct_change_dtypes = [
+        (empty_latest.iloc[:, i] / empty_earlier.iloc[:, i]).dtype 
+        for i in range(empty_latest.shape[1])]
+
+    # Calculating nominal and percentage changes for all pairs at once:
+    # (np.errstate() suppresses the warnings that NumPy would otherwise 
+    # show when dividing by 0; like pandas, it will return inf or NaN 
+    # values in these cases.)
+    change_values = latest_values - earlier_values
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct_change_values = 100 * (
+            latest_values / earlier_values - 1)
+
+    # Converting these arrays into DataFrames whose columns have the
+    # data types stored above:
+    df_change = pd.DataFrame(
+        {i:pd.array(change_values[:, i], dtype=change_dtypes[i]) 
+         for i in range(change_values.shape[1])}, index=df.index)
+    df_pct_change = pd.DataFrame(
+        {i:pd.array(pct_change_values[:, i], dtype=pct_change_dtypes[i])
+         for i in range(pct_change_values.shape[1])}, index=df.index)
+
+    # Calculating ranks and percentiles for every column within these 
+    # DataFrames via four DataFrame-wide rank() calls (rather than four 
+    # calls per column):
+    change_ranks = rank_columns(df_change, ascending=False, method='min')
+    change_percentiles = 100 * rank_columns(
+        df_change, pct=True, ascending=True, method='max')
+    pct_change_ranks = rank_columns(
+        df_pct_change, ascending=False, method='min')
+    pct_change_percentiles = 100 * rank_columns(
+        df_pct_change, pct=True, ascending=True, method='max')
+
+    # Assembling these arrays into a dictionary of new columns. (The 
+    # columns are added in the same order that create_comparison_fields()
+    # would have added them.)
+    comparison_fields = {}
+    i = 0
+    for field_var in field_vars:
+        for year in earlier_years:
+            prefix = f'{year}-{latest_year} {field_var}'
+            comparison_fields[f'{prefix} Change'] = df_change[i]
+            comparison_fields[f'{prefix} % Change'] = df_pct_change[i]
+            comparison_fields[f'{prefix} Change Rank'] = change_ranks[i]
+            comparison_fields[f'{prefix} Change Percentile'] = (
+                change_percentiles[i])
+            comparison_fields[f'{prefix} % Change Rank'] = (
+                pct_change_ranks[i])
+            comparison_fields[f'{prefix} % Change Percentile'] = (
+                pct_change_percentiles[i])
+            i += 1
+
+    df_comparisons = pd.DataFrame(comparison_fields, index=df.index)
+
+    # Columns that already exist within df (e.g. from an earlier call
+    # to this function) will get replaced by their updated versions.
+    return pd.concat(
+        [df.drop(columns=df_comparisons.columns, errors='ignore'), 
+         df_comparisons], axis=1)
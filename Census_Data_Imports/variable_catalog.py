@@ -0,0 +1,160 @@
+# Census Variable Catalog
+
+# This Python file stores a searchable catalog of American Community
+# Survey variables. Variable lists for each year and survey get saved to
+# a single SQLite database, so they only need to be downloaded and parsed
+# once. The catalog also keeps an in-memory dictionary of these variables
+# so that aliases can be looked up without filtering a DataFrame of
+# tens of thousands of rows each time.
+
+# SQLite's FTS5 extension (which is included within most Python builds)
+# is used for full-text searches of variable labels and concepts. See
+# https://www.sqlite.org/fts5.html for more information.
+
+import sqlite3
+import pandas as pd
+
+class VariableCatalog:
+    '''This class stores Census variable names, labels, concepts, and
+    groups for one or more years and surveys.
+
+    db_path: the path to the SQLite database that will store the
+    catalog. (It will get created if it doesn't exist already.) Pass
+    ':memory:' to keep the catalog in memory only.
+    '''
+
+    def __init__(self, db_path='Datasets/variable_catalog.db'):
+        self.con = sqlite3.connect(db_path, check_same_thread=False)
+        self.con.execute('''CREATE TABLE IF NOT EXISTS variables (
+            id INTEGER PRIMARY KEY, year INTEGER, survey TEXT, 
+            name TEXT, label TEXT, concept TEXT, group_name TEXT,
+            UNIQUE (year, survey, name))''')
+        # This index allows for quick prefix searches by group (e.g.
+        # all groups starting with 'B01'):
+        self.con.execute('''CREATE INDEX IF NOT EXISTS variables_group
+            ON variables (group_name, year, survey)''')
+        # This full-text index stores copies of each variable's label
+        # and concept. (Its rowid values match the id values of the
+        # variables table, allowing the two tables to be joined 
+        # together.)
+        self.con.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS
+            variables_fts USING fts5(label, concept)''')
+        self.con.commit()
+
+        # Loading all variables into a dictionary whose keys are
+        # (year, survey) tuples and whose values are dictionaries that
+        # map variable names to (label, concept) tuples:
+        self.variables = {}
+        for year, survey, name, label, concept in self.con.execute(
+            'SELECT year, survey, name, label, concept FROM variables'):
+            self.variables.setdefault((year, survey), {})[name] = (
+                label, concept)
+
+    def vintages(self):
+        '''Returns a list of the (year, survey) pairs stored within
+        the catalog.'''
+        return sorted(self.variables.keys())
+
+    def add_vintage(self, year, survey, df_variables):
+        '''Adds the variables for a given year and survey to the catalog,
+        replacing any variables already stored for that vintage.
+
+        df_variables: a DataFrame with 'Name', 'Label', 'Concept', and
+        'Group' columns, such as the one returned by
+        download_variable_list().'''
+        self.con.execute(
+            '''DELETE FROM variables_fts WHERE rowid IN (
+            SELECT id FROM variables WHERE year = ? AND survey = ?)''',
+            (year, survey))
+        self.con.execute(
+            'DELETE FROM variables WHERE year = ? AND survey = ?',
+            (year, survey))
+        rows = list(zip(
+            [year] * len(df_variables), [survey] * len(df_variables),
+            df_variables['Name'], df_variables['Label'],
+            df_variables['Concept'], df_variables['Group']))
+        self.con.executemany(
+            '''INSERT INTO variables (year, survey, name, label, concept,
+            group_name) VALUES (?, ?, ?, ?, ?, ?)''', rows)
+        self.con.execute(
+            '''INSERT INTO variables_fts (rowid, label, concept)
+            SELECT id, label, concept FROM variables
+            WHERE year = ? AND survey = ?''', (year, survey))
+        self.con.commit()
+        self.variables[(year, survey)] = {
+            row[2]: (row[3], row[4]) for row in rows}
+
+    def lookup(self, name, year, survey):
+        '''Returns the (label, concept) tuple for a given variable name,
+        or None if that variable isn't present within the catalog.'''
+        return self.variables.get((year, survey), {}).get(name)
+
+    def create_variable_aliases(self, variable_list, year, survey):
+        '''This function returns the same alias dictionary as
+        create_variable_aliases() (within census_import_scripts.py),
+        but it retrieves each variable's label and concept from the
+        catalog's in-memory dictionary rather than filtering a
+        DataFrame. Variables not found within the catalog are skipped.
+        '''
+        vintage_variables = self.variables.get((year, survey), {})
+        alias_dict = {}
+        for name in variable_list:
+            if name in vintage_variables:
+                label, concept = vintage_variables[name]
+                alias_dict[name] = f'{concept}_{label} ({name})'
+        return alias_dict
+
+    def search_groups(self, group_prefix, year=None, survey=None):
+        '''Returns a DataFrame of all variables whose group begins with
+        group_prefix (e.g. 'B01001'). Results can optionally be limited
+        to a specific year and/or survey.'''
+        query = '''SELECT year AS Year, survey AS Survey, name AS Name,
+        label AS Label, concept AS Concept, group_name AS "Group"
+        FROM variables WHERE group_name >= ? AND group_name < ?'''
+        # Using a range condition rather than LIKE allows SQLite to
+        # use the group index created above. (Appending the highest
+        # possible Unicode character to the prefix creates an upper
+        # bound for all strings that start with that prefix.)
+        params = [group_prefix, group_prefix + '\U0010ffff']
+        query, params = self.add_vintage_filters(
+            query, params, year, survey, table_prefix='')
+        return pd.read_sql(query + ' ORDER BY year, survey, name',
+                           self.con, params=params)
+
+    def search(self, text, year=None, survey=None, limit=None):
+        '''Performs a full-text search of variable labels and concepts,
+        returning matches as a DataFrame (ordered from most to least
+        relevant).
+
+        text: an FTS5 query string (e.g. 'bachelor degree' or
+        'concept: median earnings'). See
+        https://www.sqlite.org/fts5.html#full_text_query_syntax for
+        more examples.'''
+        query = '''SELECT v.year AS Year, v.survey AS Survey,
+        v.name AS Name, v.label AS Label, v.concept AS Concept,
+        v.group_name AS "Group"
+        FROM variables_fts JOIN variables v
+        ON v.id = variables_fts.rowid
+        WHERE variables_fts MATCH ?'''
+        params = [text]
+        query, params = self.add_vintage_filters(
+            query, params, year, survey, table_prefix='v.')
+        query += ' ORDER BY variables_fts.rank'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        return pd.read_sql(query, self.con, params=params)
+
+    def add_vintage_filters(self, query, params, year, survey,
+                            table_prefix):
+        '''Adds optional year and survey conditions to a query.'''
+        if year is not None:
+            query += f' AND {table_prefix}year = ?'
+            params.append(year)
+        if survey is not None:
+            query += f' AND {table_prefix}survey = ?'
+            params.append(survey)
+        return query, params
+
+    def close(self):
+        self.con.close()
@@ -8,14 +8,559 @@
 # pivot_and_graph_functions.ipynb notebook in the Graphing section
 # of Python for Nonprofits.
 
+import numpy as np
+import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from dash import dash_table
 
+def create_filter_mask(df, filter_tuple_list):
+    '''Returns a boolean NumPy array that is True for each row of df
+    whose values match all of the filters within filter_tuple_list
+    (or None if this list is empty). See autopivot() for more 
+    information on filter_tuple_list.'''
+    mask = None
+    for field, values_to_show in filter_tuple_list:
+        column = df[field]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # For categorical columns, the integer codes that represent
+            # each value are compared to the codes of the values to
+            # show. This is much faster than comparing the values 
+            # themselves.
+            codes_to_show = np.flatnonzero(
+                column.cat.categories.isin(values_to_show))
+            field_mask = np.isin(column.cat.codes.to_numpy(), 
+                                 codes_to_show)
+        else:
+            field_mask = column.isin(values_to_show).to_numpy()
+        if mask is None:
+            mask = field_mask
+        else:
+            mask = mask & field_mask
+    return mask
+
+
+def aggregate_groups(df, index, values, aggfunc, string_cols=[]):
+    '''Groups df by the columns in index, then applies aggfunc to the 
+    columns in values. The output matches that of a 
+    df.pivot_table(index=index, values=values, aggfunc=aggfunc)
+    .reset_index() call (including its sort order), but 
+    groupby(sort=False) is used to create it. This allows the output 
+    to get sorted *after* the data has been aggregated, at which point
+    it will generally have far fewer rows.
+
+    string_cols: columns within index that should be converted to 
+    strings. These conversions also take place after aggregation,
+    so only one value per group needs to be converted.
+
+    If index is empty, all rows will be aggregated into a single row.
+    '''
+    # Like pivot_table(), this function sorts the columns in values
+    # in alphabetical order.
+    values = sorted(values)
+    if len(index) == 0:
+        return df[values].groupby(
+            np.zeros(len(df), dtype='int8')).agg(aggfunc).reset_index(
+                drop=True)
+    df_pivot = df.groupby(
+        index, observed=True, sort=False, dropna=False)[values].agg(
+            aggfunc).reset_index()
+    # Removing groups whose aggregated values are all missing (which 
+    # pivot_table() would have excluded):
+    df_pivot = df_pivot.dropna(subset=values, how='all')
+    return sort_groups(df_pivot, index, string_cols)
+
+
+def sort_groups(df_pivot, index, string_cols=[]):
+    '''Converts the columns in string_cols to strings; removes groups 
+    with missing index values (which pivot_table() would have excluded);
+    and then sorts the groups by the columns in index.'''
+    for column in string_cols:
+        df_pivot[column] = df_pivot[column].astype('str')
+    df_pivot = df_pivot.dropna(subset=index)
+    return df_pivot.sort_values(index, kind='stable').reset_index(
+        drop=True)
+
+
+def get_weighted_stat_name(y, stat):
+    '''Returns the name of the column in which 
+    aggregate_weighted_groups() will store a weighted statistic other
+    than the first one requested.'''
+    if stat == 'mean':
+        return f'{y} (Weighted Mean)'
+    if stat == 'var':
+        return f'{y} (Weighted Variance)'
+    if stat == 'std':
+        return f'{y} (Weighted SD)'
+    return f'{y} (Weighted {stat:g} Quantile)'
+
+
+def aggregate_weighted_groups(df, index, y, weight_col, 
+                              weighted_stats=['mean'], string_cols=[]):
+    '''Groups df by the columns in index, then calculates weighted
+    statistics of y (using the weights in weight_col) for each group.
+    All statistics are calculated with NumPy from a single set of group
+    codes, so no columns need to be added to df.
+
+    weighted_stats: a list of the statistics to calculate. Options 
+    include 'mean'; 'var' (variance); 'std' (standard deviation); and
+    numbers between 0 and 1, which represent quantiles (e.g. 0.5 for 
+    the weighted median). The first statistic will be stored within 
+    the y column; the others will be stored in columns whose names 
+    are provided by get_weighted_stat_name().
+
+    The weights are treated as group sizes. Therefore, the variance
+    and standard deviation match those that df.var() and df.std() 
+    would return if each row were repeated weight_col times, and each
+    quantile is the lowest y value at which the cumulative weight 
+    reaches that share of the group's total weight.
+
+    The output also includes the sum of weight_col and the sum of 
+    y * weight_col (within a '{y}_*_{weight_col}' column) for each 
+    group. Rows in which y or weight_col are missing are excluded,
+    as are groups for which the first statistic can't be calculated.
+
+    string_cols: see aggregate_groups().
+    '''
+    for stat in weighted_stats:
+        if (stat not in ['mean', 'var', 'std']) and not (
+            isinstance(stat, (int, float)) and (0 <= stat <= 1)):
+            raise ValueError(f"Unknown weighted statistic: {stat}")
+
+    # Assigning a code to each row that identifies its group:
+    if len(index) == 0:
+        group_codes = np.zeros(len(df), dtype='intp')
+        df_pivot = pd.DataFrame(index=range(min(len(df), 1)))
+    else:
+        grouped = df.groupby(
+            index, observed=True, sort=False, dropna=False)
+        group_codes = grouped.ngroup().to_numpy()
+        # (Since sort=False is used, both ngroup() and size() list 
+        # groups in the order in which they first appear.)
+        df_pivot = grouped.size().reset_index()[index]
+    group_count = len(df_pivot)
+
+    weighted_sums, weight_sums, stat_values = calculate_weighted_stats(
+        group_codes, group_count, 
+        df[y].to_numpy(dtype='float64', na_value=np.nan),
+        df[weight_col].to_numpy(dtype='float64', na_value=np.nan),
+        weighted_stats)
+
+    # Keeping these sums as integers if the original columns were
+    # also integers:
+    if pd.api.types.is_integer_dtype(df[weight_col].dtype):
+        weight_sums = weight_sums.round().astype('int64')
+        if pd.api.types.is_integer_dtype(df[y].dtype):
+            weighted_sums = weighted_sums.round().astype('int64')
+    # Like pivot_table(), autopivot() has historically sorted the 
+    # weighted sum and weight columns alphabetically.
+    sum_cols = {f'{y}_*_{weight_col}':weighted_sums, 
+                weight_col:weight_sums}
+    for column in sorted(sum_cols.keys()):
+        df_pivot[column] = sum_cols[column]
+    for position, stat in enumerate(weighted_stats):
+        if position == 0:
+            df_pivot[y] = stat_values[position]
+        else:
+            df_pivot[get_weighted_stat_name(y, stat)] = (
+                stat_values[position])
+    df_pivot = df_pivot.dropna(subset=[y])
+    return sort_groups(df_pivot, index, string_cols)
+
+
+def calculate_weighted_stats(group_codes, group_count, y_values, 
+                             weights, weighted_stats=['mean']):
+    '''Calculates weighted statistics of y_values for each group. 
+    (See aggregate_weighted_groups() for more details.)
+
+    group_codes: a NumPy array that contains the group (from 0 to 
+    group_count - 1) to which each value belongs.
+
+    y_values and weights: float NumPy arrays of the same length as 
+    group_codes. Rows in which either value is missing will be skipped.
+
+    Returns the sum of y_values * weights for each group; the sum of 
+    weights for each group; and a list containing the values of each
+    statistic in weighted_stats for each group.
+    '''
+    valid = ~(np.isnan(y_values) | np.isnan(weights))
+    group_codes = group_codes[valid]
+    y_values = y_values[valid]
+    weights = weights[valid]
+
+    # np.bincount() adds together all weights that share the same
+    # group code:
+    weight_sums = np.bincount(
+        group_codes, weights=weights, minlength=group_count)
+    weighted_sums = np.bincount(
+        group_codes, weights=weights * y_values, minlength=group_count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = weighted_sums / weight_sums
+
+    variances = None
+    sort_order = None
+    stat_values = []
+    for stat in weighted_stats:
+        if stat == 'mean':
+            stat_values.append(means)
+        elif stat in ['var', 'std']:
+            if variances is None:
+                deviations = y_values - means[group_codes]
+                squared_deviation_sums = np.bincount(
+                    group_codes, weights=weights * deviations**2,
+                    minlength=group_count)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    variances = np.where(
+                        weight_sums > 1, 
+                        squared_deviation_sums / (weight_sums - 1), 
+                        np.nan)
+            stat_values.append(
+                variances if stat == 'var' else np.sqrt(variances))
+        else:
+            if sort_order is None:
+                # Sorting the rows by group, then by y, so that each
+                # group's cumulative weights can be calculated: (Rows
+                # without any weight are skipped, as they wouldn't
+                # appear within the data if each row were repeated
+                # weight_col times.)
+                positive_rows = np.flatnonzero(weights > 0)
+                sort_order = positive_rows[np.lexsort(
+                    (y_values[positive_rows], 
+                     group_codes[positive_rows]))]
+                sorted_codes = group_codes[sort_order]
+                sorted_y = y_values[sort_order]
+                cumulative_weights = np.cumsum(weights[sort_order])
+                group_starts = np.searchsorted(
+                    sorted_codes, np.arange(group_count), side='left')
+                group_stops = np.searchsorted(
+                    sorted_codes, np.arange(group_count), side='right')
+                # The cumulative weight prior to each group:
+                prior_weights = np.r_[0, cumulative_weights][group_starts]
+            quantiles = np.full(group_count, np.nan)
+            has_weight = (group_stops > group_starts) & (weight_sums > 0)
+            if has_weight.any():
+                positions = np.searchsorted(
+                    cumulative_weights, 
+                    prior_weights + stat * weight_sums, side='left')
+                positions = np.clip(
+                    positions, group_starts, group_stops - 1)
+                quantiles[has_weight] = sorted_y[positions[has_weight]]
+            stat_values.append(quantiles)
+    return weighted_sums, weight_sums, stat_values
+
+
+# The weighted aggregate functions that can be included within the
+# measures passed to autopivot(), along with the weighted statistics
+# (see aggregate_weighted_groups()) to which they correspond:
+weighted_aggfuncs = {'weighted mean':'mean', 'weighted var':'var', 
+                     'weighted std':'std', 'weighted median':0.5}
+
+def get_measure_name(y, aggfunc):
+    '''Returns the name under which autopivot() will store a given 
+    (y, aggfunc) measure (e.g. 'Score (mean)').'''
+    return f'{y} ({aggfunc})'
+
+
+def aggregate_measures(df, index, measures, weight_col=None, 
+                       string_cols=[]):
+    '''Groups df by the columns in index, then calculates each 
+    (y, aggfunc) measure within measures for each group. All measures
+    are calculated from the same groupby() call, and the output 
+    contains one column (named via get_measure_name()) per measure.
+
+    The aggregate function within each measure can be any function 
+    that groupby().agg() accepts (e.g. 'sum', 'count', or 'mean') or
+    one of the weighted functions within weighted_aggfuncs (e.g. 
+    'weighted mean'), in which case weight_col must also be provided.
+
+    string_cols: see aggregate_groups().
+    '''
+    for measure_y, aggfunc in measures:
+        if isinstance(aggfunc, str) and aggfunc.startswith('weighted '):
+            if aggfunc not in weighted_aggfuncs:
+                raise ValueError(f"Unknown weighted aggregate function: \
+{aggfunc}")
+            if weight_col is None:
+                raise ValueError(f"A weight_col must be provided in \
+order to calculate the {aggfunc} of {measure_y}.")
+
+    if len(index) == 0:
+        grouped = df.groupby(np.zeros(len(df), dtype='int8'), sort=False)
+        df_pivot = pd.DataFrame(index=range(grouped.ngroups))
+    else:
+        grouped = df.groupby(
+            index, observed=True, sort=False, dropna=False)
+        df_pivot = grouped.size().reset_index()[index]
+
+    unweighted_measures = {
+        get_measure_name(measure_y, aggfunc):(measure_y, aggfunc) 
+        for measure_y, aggfunc in measures 
+        if aggfunc not in weighted_aggfuncs}
+    if len(unweighted_measures) > 0:
+        # (Since sort=False is used, these results will be listed in 
+        # the same order as the groups within df_pivot.)
+        df_aggregated = grouped.agg(**unweighted_measures)
+        for name in unweighted_measures.keys():
+            df_pivot[name] = df_aggregated[name].to_numpy()
+
+    weighted_measures = [(measure_y, aggfunc) 
+                         for measure_y, aggfunc in measures 
+                         if aggfunc in weighted_aggfuncs]
+    if len(weighted_measures) > 0:
+        group_codes = grouped.ngroup().to_numpy()
+        weights = df[weight_col].to_numpy(dtype='float64', na_value=np.nan)
+        # Calculating all weighted statistics for each y variable at
+        # once:
+        for measure_y in dict.fromkeys(
+            measure_y for measure_y, aggfunc in weighted_measures):
+            y_aggfuncs = [aggfunc for other_y, aggfunc in weighted_measures
+                          if other_y == measure_y]
+            stat_values = calculate_weighted_stats(
+                group_codes, len(df_pivot), 
+                df[measure_y].to_numpy(dtype='float64', na_value=np.nan),
+                weights, 
+                [weighted_aggfuncs[aggfunc] for aggfunc in y_aggfuncs])[2]
+            for aggfunc, values in zip(y_aggfuncs, stat_values):
+                df_pivot[get_measure_name(measure_y, aggfunc)] = values
+
+    return sort_groups(df_pivot, index, string_cols)
+
+
+def melt_measures(df_pivot, index, measures):
+    '''Converts the output of aggregate_measures() into a 'tidy' 
+    format in which each row contains one group's value for one 
+    measure. The name of each measure is stored within a 'Measure' 
+    column, and its value is stored within a 'Value' column. This 
+    format allows each measure to be displayed within its own facet
+    of a Plotly chart.'''
+    measure_names = list(dict.fromkeys(
+        get_measure_name(measure_y, aggfunc) 
+        for measure_y, aggfunc in measures))
+    return df_pivot.melt(
+        id_vars=index, value_vars=measure_names, var_name='Measure',
+        value_name='Value').dropna(subset=['Value']).reset_index(
+            drop=True)
+
+
+def create_composite_labels(df_pivot, columns, separator='/'):
+    '''Returns a NumPy array of labels that join together the values
+    within each row of df_pivot's columns (as strings, separated by
+    separator). For instance, a row whose 'Season' and 'Gender'
+    values are 'Fall' and 'F' would receive the label 'Fall/F'.
+
+    Rather than concatenating entire columns of strings, this function
+    converts each column into integer codes; identifies each unique
+    combination of these codes; and then creates one label for each
+    of these combinations. As a result, only a small number of
+    strings will be created even for pivot tables with many rows.'''
+    combined_codes = None
+    labels = None
+    for column in columns:
+        # (use_na_sentinel=False assigns missing values their own code
+        # rather than -1, though autopivot() removes rows with missing
+        # x_vars values before this function gets called.)
+        codes, uniques = pd.factorize(df_pivot[column],
+                                      use_na_sentinel=False)
+        unique_strings = pd.Series(uniques).astype('str').to_list()
+        if combined_codes is None:
+            combined_codes = codes
+            labels = unique_strings
+            continue
+        # Encoding each row's previous combination and its value for
+        # this column within a single integer, then converting these
+        # integers back into consecutive codes: (This prevents these
+        # integers from growing too large when many columns are
+        # present.)
+        combined_codes, label_codes = pd.factorize(
+            combined_codes * len(uniques) + codes)
+        labels = [labels[label_code // len(uniques)] + separator
+                  + unique_strings[label_code % len(uniques)]
+                  for label_code in label_codes]
+    return np.array(labels, dtype='object')[combined_codes]
+
+
+def create_pivot(df_for_pivot, index, y, aggfunc, weight_col=None,
+                 weighted_stats=['mean'], string_cols=[], cube=None,
+                 measures=None):
+    '''Creates autopivot()'s pivot table by calling the aggregation
+    function that corresponds to its arguments. (If cube is provided,
+    df_for_pivot should contain rows from that cube.)'''
+    if measures is not None:
+        if cube is not None:
+            df_pivot = cube.aggregate_measures(
+                df_for_pivot, index=index, measures=measures, 
+                weight_col=weight_col, string_cols=string_cols)
+        else:
+            df_pivot = aggregate_measures(
+                df_for_pivot, index=index, measures=measures, 
+                weight_col=weight_col, string_cols=string_cols)
+        return melt_measures(df_pivot, index, measures)
+    if cube is not None:
+        df_pivot = aggregate_groups(
+            df_for_pivot, index=index, 
+            values=cube.get_measures(weight_col), aggfunc='sum', 
+            string_cols=string_cols)
+        return cube.finish_pivot(df_pivot, aggfunc, weight_col)
+    if weight_col is not None:
+        return aggregate_weighted_groups(
+            df_for_pivot, index=index, y=y, weight_col=weight_col,
+            weighted_stats=weighted_stats, string_cols=string_cols)
+    return aggregate_groups(
+        df_for_pivot, index=index, values=[y], aggfunc=aggfunc, 
+        string_cols=string_cols)
+
+
+class PivotCube:
+    '''This class stores a pre-aggregated copy (or 'cube') of a 
+    DataFrame that autopivot() can use in place of that DataFrame.
+    The cube contains one row for each combination of dimension 
+    values found within the data, along with the sum and count of
+    the y column (and, if weight_col is specified, the sums of the
+    weight column and of y multiplied by that column) for that 
+    combination.
+
+    Since the sums and counts for any subset of these dimensions can 
+    be calculated by adding these rows together, autopivot() can 
+    create a sum-, count-, mean-, or weighted-mean-based pivot table 
+    from the cube rather than from the original rows. The cube's size
+    depends on the number of combinations of dimension values rather 
+    than on the number of rows in the original data, so dashboards 
+    that use it will remain responsive as more data gets added.
+
+    df: the DataFrame to aggregate.
+
+    dimensions: the columns that can be used as x variables, colors, 
+    or filters within autopivot() calls. (If a call uses other
+    columns, autopivot() will use the original DataFrame instead.)
+
+    y: the column whose values will be aggregated.
+
+    weight_col: an optional column by which y can be weighted. (Only
+    weighted means can be calculated from the cube; other weighted
+    statistics require the original data.)
+    '''
+
+    # The aggregate functions that can be calculated from the cube:
+    supported_aggfuncs = ['sum', 'count', 'mean']
+
+    def __init__(self, df, dimensions, y, weight_col=None):
+        self.dimensions = list(dimensions)
+        self.y = y
+        self.weight_col = weight_col
+        measures = {'Cube Sum':(y, 'sum'), 'Cube Count':(y, 'count')}
+        if weight_col is not None:
+            # Like aggregate_weighted_groups(), the cube excludes rows 
+            # whose y or weight values are missing from its weighted 
+            # sums.
+            valid = df[y].notna() & df[weight_col].notna()
+            df = df.assign(**{
+                'Cube Weighted Y':(df[y] * df[weight_col]).where(valid),
+                'Cube Valid Weight':df[weight_col].where(valid)})
+            measures['Cube Weighted Sum'] = ('Cube Weighted Y', 'sum')
+            measures['Cube Weight'] = ('Cube Valid Weight', 'sum')
+        # Missing dimension values are kept (via dropna=False) so that
+        # their rows will still be included within pivot tables that 
+        # don't use those dimensions.
+        self.df_cube = df.groupby(
+            self.dimensions, observed=True, sort=False, 
+            dropna=False).agg(**measures).reset_index()
+        print(f"Created a cube with {len(self.df_cube)} rows from a \
+DataFrame with {len(df)} rows.")
+
+    def can_answer(self, y, aggfunc, weight_col, fields, 
+                   weighted_stats=['mean']):
+        '''Returns True if a pivot table of y based on aggfunc, 
+        weight_col (and weighted_stats), and the columns in fields can
+        be created from the cube.'''
+        if (y != self.y) or (set(fields) - set(self.dimensions)):
+            return False
+        if weight_col is not None:
+            return ((weight_col == self.weight_col) 
+                    and (list(weighted_stats) == ['mean']))
+        return aggfunc in self.supported_aggfuncs
+
+    def can_answer_measures(self, measures, weight_col, fields):
+        '''Returns True if all of the (y, aggfunc) measures within 
+        measures (see aggregate_measures()) can be calculated from the
+        cube for the columns in fields.'''
+        if set(fields) - set(self.dimensions):
+            return False
+        for measure_y, aggfunc in measures:
+            if measure_y != self.y:
+                return False
+            if aggfunc == 'weighted mean':
+                if (weight_col is None) or (weight_col != self.weight_col):
+                    return False
+            elif aggfunc not in self.supported_aggfuncs:
+                return False
+        return True
+
+    def calculate_measure(self, df_sums, aggfunc):
+        '''Calculates a measure from the summed cube columns within
+        df_sums.'''
+        if aggfunc == 'sum':
+            return df_sums['Cube Sum']
+        if aggfunc == 'count':
+            return df_sums['Cube Count']
+        if aggfunc == 'mean':
+            return df_sums['Cube Sum'] / df_sums['Cube Count']
+        return df_sums['Cube Weighted Sum'] / df_sums['Cube Weight']
+
+    def aggregate_measures(self, df_cube, index, measures, 
+                           weight_col=None, string_cols=[]):
+        '''The cube-based equivalent of aggregate_measures(). df_cube
+        should contain rows from self.df_cube.'''
+        cube_cols = self.get_measures(None)
+        if any(aggfunc == 'weighted mean' for measure_y, aggfunc 
+               in measures):
+            cube_cols = cube_cols + self.get_measures(weight_col)
+        df_sums = aggregate_groups(
+            df_cube, index=index, values=cube_cols, aggfunc='sum', 
+            string_cols=string_cols)
+        for measure_y, aggfunc in measures:
+            df_sums[get_measure_name(measure_y, aggfunc)] = (
+                self.calculate_measure(df_sums, aggfunc))
+        return df_sums.drop(columns=cube_cols)
+
+    def get_measures(self, weight_col):
+        '''Returns the cube columns needed to calculate a pivot table
+        (with or without weights).'''
+        if weight_col is not None:
+            return ['Cube Weighted Sum', 'Cube Weight']
+        return ['Cube Sum', 'Cube Count']
+
+    def finish_pivot(self, df_pivot, aggfunc, weight_col):
+        '''Converts the summed cube measures within df_pivot into the
+        columns that autopivot() would have created from the original
+        data.'''
+        if weight_col is not None:
+            # Like pivot_table(), autopivot() sorts these columns 
+            # alphabetically.
+            df_pivot = df_pivot.rename(columns={
+                'Cube Weighted Sum':f'{self.y}_*_{weight_col}', 
+                'Cube Weight':weight_col})
+            value_cols = sorted([f'{self.y}_*_{weight_col}', weight_col])
+            df_pivot = df_pivot[
+                [column for column in df_pivot.columns 
+                 if column not in value_cols] + value_cols]
+            df_pivot[self.y] = (df_pivot[f'{self.y}_*_{weight_col}'] 
+                                / df_pivot[weight_col])
+            return df_pivot.dropna(subset=[self.y]).reset_index(
+                drop=True)
+        df_pivot[self.y] = self.calculate_measure(df_pivot, aggfunc)
+        if aggfunc == 'mean':
+            # Groups whose y values were all missing would have been
+            # excluded from a pivot table of the original data:
+            df_pivot = df_pivot.dropna(subset=[self.y]).reset_index(
+                drop=True)
+        return df_pivot.drop(columns=['Cube Sum', 'Cube Count'])
+
+
 def autopivot(df, y, aggfunc, x_vars=[], color=None, 
               x_vars_to_exclude=[], overall_data_name='All Data',
              weight_col=None, filter_tuple_list=[],
-             convert_x_vars_to_strings=True):
+             convert_x_vars_to_strings=True, cube=None,
+             weighted_stats=['mean'], measures=None):
     '''
     This function will create a pivot table of df that can be used 
     as the data source for Plotly graphs. It will also return x, y, 
@@ -68,6 +613,21 @@ def autopivot(df, y, aggfunc, x_vars=[], color=None,
     be used to calculate weighted averages. (If weight_col is None,
     weighted averages will *not* be calculated.)
 
+    weighted_stats: the weighted statistics to calculate when weight_col
+    is provided. The first of these will be stored within the y column
+    (and thus displayed within charts). See aggregate_weighted_groups()
+    for the available options.
+
+    measures: an optional list of (y, aggfunc) tuples (e.g. 
+    [('Score', 'count'), ('Score', 'mean'), ('Score', 'weighted mean')])
+    to calculate in place of y and aggfunc. (y and aggfunc can be set
+    to None when measures is provided.) All of these measures will be
+    calculated at once, and the pivot table will be returned in a 
+    'tidy' format that stores each measure's name within a 'Measure' 
+    column and its value within a 'Value' column. ('Value' will be
+    returned as the y variable.) See aggregate_measures() for the 
+    available aggregate functions.
+
     filter_tuple_list: A list of tuples that allow the DataFrame
     to show only a specific set of data. The first item in each tuple
     should be a field name, and the second item should be a list of
@@ -77,64 +637,108 @@ def autopivot(df, y, aggfunc, x_vars=[], color=None,
     all x variables not found in x_vars_to_exclude to strings.
     (This can improve the appearance of any graphs that make use of
     the pivot table created by this function.)
+
+    cube: an optional PivotCube of df. If the pivot table can be
+    calculated from this cube, it will be used in place of df.
     '''
 
-    # Creating a copy of the initial dataset in order to ensure that the 
-    # following code does not modify it:
-    df_for_pivot = df.copy()
+    # Copying x_vars so that the caller's list won't get modified by
+    # the remove() calls below:
+    x_vars = list(x_vars)
 
-    # Filtering the DataFrame based on the contents (if any)
-    # of filter_tuple_list:
-    for pair in filter_tuple_list:
-        df_for_pivot.query(
-            f"`{pair[0]}` in {pair[1]}", inplace=True)
+    # If y also serves as an x variable or as the color variable (e.g.
+    # when mean scores are colored by score), the pivot table would 
+    # need to contain two columns with the same name. Therefore, the
+    # data will instead be grouped by a copy of y with a different 
+    # name. (This copy gets added to the rows used for the pivot table
+    # below.)
+    y_group_name = None
+    if (measures is None) and (y in x_vars + [color]):
+        y_group_name = f'{y} Group'
+        x_vars = [y_group_name if x_var == y else x_var 
+                  for x_var in x_vars]
+        x_vars_to_exclude = [y_group_name if x_var == y else x_var 
+                             for x_var in x_vars_to_exclude]
+        if color == y:
+            color = y_group_name
+
+    # Earlier versions of this function began by copying all of df, 
+    # then applied each filter via a separate query() call and converted
+    # the x variables to strings before calling pivot_table(). These
+    # steps took place every time a dashboard was updated. The
+    # following code instead (1) combines all filters into a single 
+    # boolean mask; (2) retrieves only the rows and columns needed for
+    # the pivot table; and (3) defers string conversions until after 
+    # the data has been aggregated (within aggregate_groups()).
 
     # Determining which x variables will appear in the final chart:
     x_vars_for_chart = list(set(x_vars) - set(x_vars_to_exclude))
-
-    # Converting all x variables wthin chart to string form (if
-    # requested by the caller):
-    if convert_x_vars_to_strings == True:    
-        for x_var in x_vars_for_chart:
-            df_for_pivot[x_var] = (
-                df_for_pivot[x_var].astype('str').copy())
-            
     x_var_count = len(x_vars_for_chart)
 
+    # All x variables within the chart will get converted to 
+    # string form (if requested by the caller):
+    if convert_x_vars_to_strings == True:
+        string_cols = x_vars_for_chart
+    else:
+        string_cols = []
+
+    # Determining whether the pivot table can be created from a 
+    # pre-aggregated cube: (This requires all x variables, the color
+    # variable, and all filter columns to be dimensions of the cube.)
+    pivot_fields = (x_vars + ([color] if color is not None else []) 
+                    + [pair[0] for pair in filter_tuple_list])
+    if measures is not None:
+        use_cube = (cube is not None) and cube.can_answer_measures(
+            measures=measures, weight_col=weight_col, 
+            fields=pivot_fields)
+    else:
+        use_cube = (cube is not None) and cube.can_answer(
+            y=y, aggfunc=aggfunc, weight_col=weight_col, 
+            fields=pivot_fields, weighted_stats=weighted_stats)
+
+    if use_cube == True:
+        # The pivot table will be created by adding together the 
+        # relevant rows within the cube. (Since the filter columns are
+        # dimensions of the cube, the filters can be applied to it 
+        # directly.)
+        df_for_pivot = cube.df_cube
+        filter_mask = create_filter_mask(df_for_pivot, filter_tuple_list)
+        if filter_mask is not None:
+            df_for_pivot = df_for_pivot[filter_mask]
 
-    if weight_col is not None: # In this case, weighted averages
-        # will be calculated.
-        # Multiplying each y value by its corresponding weight in order
-        # to allow weighted averages to be calculated:
-        df_for_pivot[f'{y}_*_{weight_col}'] = (
-            df_for_pivot[y] * df_for_pivot[weight_col])
-        # These 'y_*_weight' values will get added together during the 
-        # pivot table call, as will the corresponding weight column 
-        # values.
+    else:
+        # Retrieving the rows and columns that will be used to create
+        # the pivot table: (dict.fromkeys() removes duplicates while 
+        # preserving the original order.)
+        if measures is not None:
+            y_cols = [measure_y for measure_y, aggfunc in measures]
+        else:
+            y_cols = [y]
+        cols_for_pivot = list(dict.fromkeys(
+            [col for col in x_vars + ([color] if color is not None 
+                                      else []) if col != y_group_name]
+            + y_cols + ([weight_col] if weight_col is not None else [])))
+        filter_mask = create_filter_mask(df, filter_tuple_list)
+        if filter_mask is None:
+            df_for_pivot = df[cols_for_pivot]
+        else:
+            df_for_pivot = df.loc[filter_mask, cols_for_pivot]
+        if y_group_name is not None:
+            df_for_pivot = df_for_pivot.assign(
+                **{y_group_name: df_for_pivot[y]})
+        # (If weight_col was provided, weighted statistics will be 
+        # calculated within aggregate_weighted_groups().)
     
     if x_var_count == 0: # Because no comparison variables will appear in
         # the final chart, the function will instead group all data 
-        # together. It will do so by creating a new column that has the 
-        # same value for each row.
-        # This column can then serve as the index for both the pivot 
-        # function and the color value.
-        df_for_pivot[overall_data_name] = overall_data_name
-
-        if weight_col is not None: # In this case, a weighted average
-            # of all data within the table will be created.
-            df_pivot = df_for_pivot.pivot_table(
-            index=overall_data_name, 
-                values=[f'{y}_*_{weight_col}', weight_col], 
-            aggfunc='sum').reset_index()
-            # Calculating the weighted average of y by dividing
-            # the y_*_weight_col field by its corresponding group size:
-            df_pivot[y] = (df_pivot[f'{y}_*_{weight_col}'] 
-                           / df_pivot[weight_col])
-        
-        else:
-            df_pivot = df_for_pivot.pivot_table(
-                index=overall_data_name, values=y, 
-                aggfunc=aggfunc).reset_index()
+        # together. The resulting row will then be given an
+        # overall_data_name column that can serve as the x value and 
+        # the color value.
+        df_pivot = create_pivot(
+            df_for_pivot, index=[], y=y, aggfunc=aggfunc, 
+            weight_col=weight_col, weighted_stats=weighted_stats,
+            cube=cube if use_cube == True else None, measures=measures)
+        df_pivot.insert(0, overall_data_name, overall_data_name)
         x_val_name=overall_data_name
         color=overall_data_name
         barmode='relative'
@@ -183,21 +787,13 @@ def autopivot(df, y, aggfunc, x_vars=[], color=None,
         if color is not None and color not in index:
             index.append(color)
     
-        print("index prior to pivot_table() call:", index)
-
-        if weight_col is not None: # In this case, weighted averages
-            # will be calculated.
-            df_pivot = df_for_pivot.pivot_table(
-                index=index, values=[
-                    f'{y}_*_{weight_col}', weight_col], 
-                aggfunc='sum').reset_index()           
-            df_pivot[y] = (
-                df_pivot[f'{y}_*_{weight_col}'] / df_pivot[weight_col])
-            
-        else:
-            df_pivot = df_for_pivot.pivot_table(
-                index=index, values=y, 
-                aggfunc=aggfunc).reset_index()
+        print("index prior to create_pivot() call:", index)
+
+        df_pivot = create_pivot(
+            df_for_pivot, index=index, y=y, aggfunc=aggfunc, 
+            weight_col=weight_col, weighted_stats=weighted_stats,
+            string_cols=string_cols, 
+            cube=cube if use_cube == True else None, measures=measures)
     
         # Now that the pivot table has been created, the variables
         # in x_vars_to_exclude can be removed from our x_vars list, our 
@@ -217,16 +813,11 @@ def autopivot(df, y, aggfunc, x_vars=[], color=None,
         # incorporated into its own values:
         x_val_name = ('/').join(x_vars)
 
-        # Initializing the x_val_name column values (which will serve
-        # as the x axis entries within Plotly charts) by 
-        # converting the first item within x_vars to a string,
-        # then adding other string-formatted values to it:
+        # Creating the x_val_name column values (which will serve
+        # as the x axis entries within Plotly charts) by joining
+        # together each row's string-formatted x_vars values:
         # (Slashes will separate these various values.)
-        df_pivot[x_val_name] = df_pivot[x_vars[0]].astype('str')
-        for i in range(1, len(x_vars)):
-            df_pivot[x_val_name] = (
-                df_pivot[x_val_name] 
-                + '/' + df_pivot[x_vars[i]].astype('str'))
+        df_pivot[x_val_name] = create_composite_labels(df_pivot, x_vars)
     
         # If there are fewer than two unique variables to be graphed, 
         # we'll want to set the barmode argument to 'relative' so that, 
@@ -252,12 +843,16 @@ def autopivot(df, y, aggfunc, x_vars=[], color=None,
         else:
             barmode = 'group'
     
+    if measures is not None: # The values of all measures are stored
+        # within the 'Value' column.
+        y = 'Value'
+
     return df_pivot, x_val_name, y, color, barmode, x_var_count, \
     index, aggfunc
 
 def autobar(df_pivot, x_val_name, y, color, barmode, x_var_count, 
             index, aggfunc, custom_aggfunc_name=None,
-           text_auto='.2f'):
+           text_auto='.2f', facet_col=None):
     '''This function creates a bar graph of a pivot table (such as one
     created within autopivot()). 
     Most arguments for this function
@@ -279,6 +874,12 @@ def autobar(df_pivot, x_val_name, y, color, barmode, x_var_count,
     to show labels as integers; and '.1%' to show labels in percentage
     form with a single decimal point. These are just some of the many
     options you can pass for this argument.
+
+    facet_col: an optional column whose values will each be displayed
+    within a separate facet (i.e. subplot) of the chart. Pass 'Measure'
+    when df_pivot was created by an autopivot() call that included
+    the measures argument; each measure will then be shown within its
+    own facet (with its own y axis).
     '''
     
     # Creating a title for the chart:
@@ -307,7 +908,13 @@ def autobar(df_pivot, x_val_name, y, color, barmode, x_var_count,
     # titles with 'Total'; other aggregate function names are left
     # in place.
     
-    if custom_aggfunc_name is not None:
+    # When multiple measures are displayed, their names (which already
+    # include their aggregate functions) will be listed in place of y.
+    y_title = y
+    if facet_col is not None:
+        aggfunc_name = ''
+        y_title = (', ').join(df_pivot[facet_col].unique())
+    elif custom_aggfunc_name is not None:
         aggfunc_name = custom_aggfunc_name
     else:
         if aggfunc in ['count', 'sum']:
@@ -322,23 +929,36 @@ def autobar(df_pivot, x_val_name, y, color, barmode, x_var_count,
         # definition, as doing so would add an extra space
         # to the title.
         if len(aggfunc_name) == 0:
-            plot_title = f"Overall {y}"    
+            plot_title = f"Overall {y_title}"    
         else:
-            plot_title = f"Overall {aggfunc_name.title()} {y}"
+            plot_title = f"Overall {aggfunc_name.title()} {y_title}"
     elif len(index) == 1:
-        plot_title = f"{aggfunc_name.title()} {y} by {index[0]}"
+        plot_title = f"{aggfunc_name.title()} {y_title} by {index[0]}"
     elif len(index) == 2:
-        plot_title = f"{aggfunc_name.title()} {y} \
+        plot_title = f"{aggfunc_name.title()} {y_title} \
 by {index[0]} and {index[1]}" 
     else:
-        plot_title = f"{aggfunc_name.title()} {y} by {(', ').join(
+        plot_title = f"{aggfunc_name.title()} {y_title} by {(', ').join(
             index[0:-1])}, and {index[-1]}" 
+    # Removing the leading space that an empty aggfunc_name would
+    # otherwise leave in place:
+    plot_title = plot_title.strip()
 
     if len(df_pivot) > 0:
-        # The following code will still work if color is set to None.
+        # The following code will still work if color and facet_col
+        # are set to None.
         fig = px.bar(df_pivot, x = x_val_name, y = y, 
                color=color, barmode=barmode,
-               text_auto=text_auto, title=plot_title)
+               text_auto=text_auto, title=plot_title, 
+               facet_col=facet_col)
+        if facet_col is not None:
+            # Since the facets' values may have very different scales
+            # (e.g. counts and means), each facet will receive its own
+            # y axis. In addition, the 'Measure=' prefix will be 
+            # removed from each facet's title.
+            fig.update_yaxes(matches=None, showticklabels=True)
+            fig.for_each_annotation(lambda annotation: annotation.update(
+                text=annotation.text.split('=', 1)[-1]))
     else: # In this case, there's no data to plot,
         # so an empty figure will be returned instead.
         fig = px.bar(title=plot_title)
@@ -375,7 +995,8 @@ def autopivot_plus_bar(
     x_vars_to_exclude=[], overall_data_name='All Data',
     weight_col=None, filter_tuple_list=[],
     custom_aggfunc_name=None, convert_x_vars_to_strings=True,
-    create_table=False, text_auto='.2f'):
+    create_table=False, text_auto='.2f', cube=None,
+    weighted_stats=['mean'], measures=None):
     '''This function calls both autopivot() and autobar(), thus 
     simplifying the process of using both functions within a script. 
     Almost all of the variables within this function correspond to
@@ -383,7 +1004,10 @@ def autopivot_plus_bar(
     those functions' definitions for explanations of them.
     
     create_table: set to True to return a table along with the bar 
-    graph.'''
+    graph.
+    
+    If measures is provided, each measure will be displayed within
+    its own facet of the bar graph.'''
         
     df_pivot, x_val_name, y, color, barmode, x_var_count, \
     index, aggfunc=autopivot(
@@ -392,14 +1016,16 @@ def autopivot_plus_bar(
         x_vars_to_exclude=x_vars_to_exclude,
         overall_data_name=overall_data_name, weight_col=weight_col,
     filter_tuple_list=filter_tuple_list,
-    convert_x_vars_to_strings=convert_x_vars_to_strings)
+    convert_x_vars_to_strings=convert_x_vars_to_strings, cube=cube,
+    weighted_stats=weighted_stats, measures=measures)
 
     fig_bar = autobar(
         df_pivot=df_pivot, x_val_name=x_val_name, y=y, 
         color=color, barmode=barmode, x_var_count=x_var_count, 
         index=index, aggfunc=aggfunc, 
         custom_aggfunc_name=custom_aggfunc_name,
-    text_auto=text_auto)
+    text_auto=text_auto, 
+    facet_col='Measure' if measures is not None else None)
 
     if create_table == False:
         return fig_bar
@@ -7,7 +7,10 @@ offline_import = False # Allows for source data to get read in locally,
 # which may improve performance when debugging or editing the code. 
 # (This should be set to False prior to deploying this app online.)
 
+import os
+import hashlib
 import pandas as pd
+from figure_cache import FigureCache
 
 def improve_col_display(df):
     '''This function replaces underscores in column names with spaces
@@ -58,4 +61,26 @@ df_survey_results_extra_data = df_survey_results.merge(
  'College', 'Class Of', 'Level', 'Level For Sorting']]
 
 print("Merged enrollment and survey data together to create \
-df_survey_results_extra_data.")
\ No newline at end of file
+df_survey_results_extra_data.")
+
+# Calculating a version for the data imported above: (This hash of
+# the datasets' contents will be identical for every gunicorn worker
+# that imports the same data, so these workers can share the 
+# cached output stored within FIGURE_CACHE_FOLDER. Once the source 
+# data changes, the version will change as well, so output created
+# from the previous data won't be reused.)
+data_version = hashlib.sha256(b''.join(
+    pd.util.hash_pandas_object(df, index = False).to_numpy().tobytes()
+    for df in [df_curr_enrollment, df_survey_results_extra_data])
+    ).hexdigest()[:24]
+
+# Creating a cache for the charts and tables that this app's dashboards
+# generate: (See figure_cache.py for more details.) Because the data 
+# above is only imported once, data_version only needs to be 
+# calculated once also. To share cached output across gunicorn 
+# workers, set the FIGURE_CACHE_FOLDER environment variable to a 
+# folder that all workers can access.
+figure_cache = FigureCache(
+    max_entries = int(os.environ.get('FIGURE_CACHE_ENTRIES', 256)),
+    disk_folder = os.environ.get('FIGURE_CACHE_FOLDER'),
+    version_function = lambda: data_version)
@@ -0,0 +1,282 @@
+# Figure Cache
+# By Kenneth Burchfiel
+# Released under the MIT License
+
+# The callbacks within this app's dashboards create their charts from
+# scratch every time they're called. However, there are only so many
+# combinations of menu options that users can choose, and the data
+# behind these charts changes infrequently (if at all). Therefore,
+# this file defines a FigureCache class that can store the output of
+# these callbacks and return it whenever the same inputs are requested
+# again.
+
+# Each output is stored under a key made up of (1) the name of the
+# function that created it; (2) the inputs that were passed to that
+# function; and (3) the version of the underlying data. As a
+# result, once the data changes, previously cached outputs will no
+# longer be used.
+
+# Because the disk folder can be shared by several processes, these 
+# versions should identify the data itself (e.g. via a hash of its
+# contents) rather than the order in which a given process happened 
+# to load it. They should also be comparable (with newer versions 
+# being greater than older ones), since files are only deleted from
+# the disk folder once a newer version of the data has been seen.
+
+# Outputs can be stored in two places:
+# 1. Memory (within each process). Only the max_entries most recently
+# used outputs will be kept.
+# 2. (Optionally) a folder on disk. Because this folder can be shared by
+# all of the gunicorn workers that run this app, an output created by
+# one worker can be reused by the others.
+
+# Note: identical copies of this file are stored within the
+# PFN_Dash_App_Demo and Simple_App_Without_Login folders, since each
+# of these apps gets deployed separately.
+
+import os
+import pickle
+import hashlib
+import threading
+import functools
+from collections import OrderedDict
+
+def normalize_inputs(value):
+    '''Converts lists, tuples, and dictionaries (including nested ones)
+    within value into tuples so that they can be used as part of a
+    dictionary key. (Dash passes multi-select dropdown values to
+    callbacks as lists, which can't be hashed.)'''
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize_inputs(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((str(key), normalize_inputs(item))
+                            for key, item in value.items()))
+    return value
+
+
+def hash_key(key):
+    '''Returns a short hash of key that can be used as part of a
+    filename.'''
+    return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()[:24]
+
+
+def write_pickle(value, path):
+    '''Saves value as a pickle file at path. Writing to a temporary 
+    file, then renaming it, prevents other workers from reading a
+    partially written file.'''
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'wb') as file:
+        pickle.dump(value, file)
+    os.replace(temp_path, path)
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError: # Another worker may have already deleted this 
+        # file.
+        pass
+
+
+class FigureCache:
+    '''This class stores the outputs of Dash callbacks (or any other
+    function) in memory and, optionally, on disk.
+
+    max_entries: the maximum number of outputs to store in memory. Once
+    this limit is reached, the least recently used output will be
+    removed.
+
+    disk_folder: the folder in which outputs will also be stored as
+    pickle files. (It will get created if it doesn't exist already.)
+    Set to None (the default) to store outputs in memory only.
+
+    version_function: an optional function (with no arguments) whose
+    output changes whenever the underlying data changes (e.g. a
+    hash of that data). If it isn't provided, the data will be treated
+    as unchanging. (Individual functions can also determine their 
+    data's version from one of their arguments; see memoize().)
+    '''
+
+    def __init__(self, max_entries = 256, disk_folder = None,
+                 version_function = None):
+        self.max_entries = max_entries
+        self.disk_folder = disk_folder
+        self.version_function = version_function
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.versions = {} # The most recent data version seen by each
+        # function (used to remove outdated files from disk_folder)
+        self.hits = 0
+        self.misses = 0
+        if disk_folder is not None:
+            os.makedirs(disk_folder, exist_ok = True)
+
+    def get_version(self):
+        if self.version_function is None:
+            return None
+        return self.version_function()
+
+    def get_path(self, name, version, key):
+        return os.path.join(
+            self.disk_folder,
+            f'{name}_{hash_key(version)}_{hash_key(key)}.pkl')
+
+    def get_version_path(self, name, version):
+        '''Returns the path of the file that stores the version whose
+        outputs are saved under the hash of that version. (This allows
+        remove_outdated_files() to determine which versions are older
+        than the current one.)'''
+        return os.path.join(
+            self.disk_folder, f'{name}_{hash_key(version)}.version')
+
+    def get(self, name, version, key):
+        '''Returns a tuple containing (1) True if an output was found
+        for key (and False otherwise) and (2) that output (or None).'''
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, self.entries[key]
+        if self.disk_folder is not None:
+            try:
+                with open(self.get_path(name, version, key), 'rb') as file:
+                    value = pickle.load(file)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                pass
+            else:
+                # Copying this output into memory so that it can be
+                # retrieved more quickly next time:
+                self.set(name, version, key, value, write_to_disk = False)
+                with self.lock:
+                    self.hits += 1
+                return True, value
+        with self.lock:
+            self.misses += 1
+        return False, None
+
+    def set(self, name, version, key, value, write_to_disk = True):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last = False)
+        if (self.disk_folder is not None) and (write_to_disk == True):
+            # The version itself is saved alongside the output (if it
+            # hasn't been saved already) so that remove_outdated_files()
+            # can compare it to newer versions.
+            version_path = self.get_version_path(name, version)
+            try:
+                if not os.path.exists(version_path):
+                    write_pickle(version, version_path)
+                write_pickle(value, self.get_path(name, version, key))
+            except OSError: # Another worker may have removed this
+                # output's temporary file (if it was created from 
+                # outdated data); in that case, it will only be kept
+                # in memory.
+                pass
+
+    def remove_outdated_files(self, name, version):
+        '''Deletes files within disk_folder that were created by the
+        function called name using an *older* version of the data. 
+        (Files created from other versions, which other workers may
+        still be using, are left in place.)'''
+        version_suffix = '.version'
+        for entry in os.scandir(self.disk_folder):
+            if not (entry.name.startswith(f'{name}_') 
+                    and entry.name.endswith(version_suffix)):
+                continue
+            version_hash = entry.name[len(name) + 1:-len(version_suffix)]
+            if len(version_hash) != 24: # This file belongs to a 
+                # different function whose name begins with name.
+                continue
+            try:
+                with open(entry.path, 'rb') as file:
+                    saved_version = pickle.load(file)
+                is_outdated = saved_version < version
+            except (OSError, EOFError, pickle.UnpicklingError, 
+                    TypeError): # TypeError will be raised if the two
+                # versions can't be compared.
+                continue
+            if is_outdated == False:
+                continue
+            outdated_prefix = f'{name}_{version_hash}_'
+            for output_entry in os.scandir(self.disk_folder):
+                if output_entry.name.startswith(outdated_prefix):
+                    remove_file(output_entry.path)
+            remove_file(entry.path)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def memoize(self, name = None, argument_version_function = None):
+        '''Returns a decorator that caches the output of the function
+        it's applied to. This decorator should be placed below Dash's
+        @callback() decorator, e.g.:
+
+        @callback(Output(...), Input(...))
+        @figure_cache.memoize()
+        def display_graph(...):
+
+        name: the name under which this function's outputs will be
+        stored. (Defaults to the function's module and name.)
+
+        argument_version_function: an optional function that accepts
+        the decorated function's first argument (e.g. a snapshot of 
+        the data that it will use) and returns that argument's version.
+        If it's provided, this version will be used in place of 
+        version_function's output, and the first argument will be left
+        out of the key. Passing the data into the decorated function
+        this way ensures that each output will be stored under the 
+        version of the data that it was actually created from.
+
+        Note that the function's output should depend only on its
+        inputs and on the data tracked by version_function (or 
+        argument_version_function). In addition, cached outputs are 
+        shared between callers, so they shouldn't be modified after 
+        they are returned.'''
+        def decorator(function):
+            function_name = name
+            if function_name is None:
+                function_name = (
+                    f"{function.__module__}.{function.__name__}".replace(
+                        '.', '-'))
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if argument_version_function is None:
+                    version = self.get_version()
+                    key_args = args
+                else:
+                    version = argument_version_function(args[0])
+                    key_args = args[1:]
+                key = (function_name, version, 
+                       normalize_inputs(key_args), 
+                       normalize_inputs(kwargs))
+                with self.lock:
+                    version_changed = (
+                        self.versions.get(function_name, version)
+                        != version)
+                    self.versions[function_name] = version
+                if version_changed == True:
+                    # Outputs based on other versions of the data
+                    # will no longer be requested by this process
+                    # (since their keys contain those versions), so 
+                    # they're removed here to free up space. (Only
+                    # files based on older data are removed from the
+                    # disk folder, though.)
+                    with self.lock:
+                        for outdated_key in [
+                            entry_key for entry_key in self.entries
+                            if entry_key[0] == function_name]:
+                            del self.entries[outdated_key]
+                    if self.disk_folder is not None:
+                        self.remove_outdated_files(function_name, version)
+                found, value = self.get(function_name, version, key)
+                if found == True:
+                    return value
+                value = function(*args, **kwargs)
+                self.set(function_name, version, key, value)
+                return value
+            return wrapper
+        return decorator
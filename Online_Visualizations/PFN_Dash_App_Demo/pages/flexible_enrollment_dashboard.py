@@ -10,13 +10,13 @@ import dash
 from dash import html, dcc, callback, Output, Input, dash_table
 import dash_bootstrap_components as dbc
 
-from data_import import df_curr_enrollment
+from data_import import df_curr_enrollment, figure_cache
 import plotly.express as px
 
 # The following auto_pivot_and_graph code was featured 
 # within the Pivot and Graph Functions section of PFN.
 
-from auto_pivot_and_graph import autopivot_plus_bar
+from auto_pivot_and_graph import autopivot_plus_bar, PivotCube
 from import_layout import import_layout
 
 dash.register_page(__name__, path='/flexible_enrollment_dashboard')
@@ -42,6 +42,15 @@ comparison_list = list(
 color_list = comparison_list.copy() # These lists can contain
 # the same values.
 
+# Pre-aggregating enrollment totals for every combination of the 
+# comparison options: (autopivot_plus_bar() can then create its
+# pivot tables from this cube, whose size doesn't depend on the 
+# number of students, rather than from df_curr_enrollment. See
+# the PivotCube definition within auto_pivot_and_graph.py for
+# more details.)
+enrollment_cube = PivotCube(
+    df_curr_enrollment, dimensions=comparison_list, y='Enrollment')
+
 # Setting default comparison and color values:
 comparison_default = ['Level For Sorting', 'Level']
 color_default = 'College'
@@ -98,7 +107,10 @@ layout = dbc.Container([
 )
 
 # The following function calls autopivot_plus_bar() to convert
-# the input values specified above into a bar chart:
+# the input values specified above into a bar chart. (Charts and
+# tables that were already created for the same inputs will be
+# retrieved from figure_cache instead; see figure_cache.py.)
+@figure_cache.memoize()
 def display_graph(x_vars, color, college_filter, 
                   level_filter, gender_filter):
     print(college_filter,level_filter, gender_filter)
@@ -124,7 +136,7 @@ def display_graph(x_vars, color, college_filter,
         overall_data_name='All Data',
     weight_col=None, filter_tuple_list=filter_tuple_list,
     custom_aggfunc_name='', create_table=True,
-    text_auto='.0f')
+    text_auto='.0f', cube=enrollment_cube)
 
     print(table)
 
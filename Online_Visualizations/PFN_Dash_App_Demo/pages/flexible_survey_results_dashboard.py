@@ -11,10 +11,28 @@
 
 import dash
 from dash import html, dcc, callback, Output, Input
-from data_import import df_survey_results_extra_data
+from data_import import df_survey_results_extra_data, figure_cache
 import plotly.express as px
 import dash_bootstrap_components as dbc
-from auto_pivot_and_graph import autopivot_plus_bar
+from auto_pivot_and_graph import autopivot_plus_bar, PivotCube
+
+# Pre-aggregating survey scores for every combination of the comparison
+# and color options found below: (See the PivotCube definition within
+# auto_pivot_and_graph.py for more details.)
+# 'Score' is left out of these dimensions: including it would create a
+# separate cube row for each distinct score within each combination,
+# thus making the cube nearly as large as the original data. (Graphs
+# that use 'Score' as a color will instead be created from the original
+# rows, as autopivot() only uses the cube when all of the requested
+# fields are among its dimensions. Since 'Score' is also the y value, 
+# autopivot() will group these rows by a copy of it named 
+# 'Score Group'.)
+survey_results_cube = PivotCube(
+    df_survey_results_extra_data, 
+    dimensions=['Starting Year', 'Season', 'Gender', 
+                'Matriculation Year', 'College', 'Class Of', 'Level', 
+                'Level For Sorting'], 
+    y='Score')
 
 dash.register_page(__name__, path='/flexible_survey_results_dashboard')
 
@@ -66,7 +84,9 @@ layout = dbc.Container([
     Input('college_filter', 'value'),
     Input('level_filter', 'value')
 )
-
+# Reusing previously created charts for combinations of inputs
+# that have already been requested: (See figure_cache.py.)
+@figure_cache.memoize()
 def display_graph(x_vars, color, college_filter, level_filter):
     print(college_filter,level_filter)
 
@@ -83,4 +103,5 @@ def display_graph(x_vars, color, college_filter, level_filter):
         aggfunc='mean', x_vars=x_vars, color=color,
     x_vars_to_exclude=['Level For Sorting'], 
         overall_data_name='All Data',
-    weight_col=None, filter_tuple_list=filter_tuple_list)
\ No newline at end of file
+    weight_col=None, filter_tuple_list=filter_tuple_list,
+    cube=survey_results_cube)
\ No newline at end of file
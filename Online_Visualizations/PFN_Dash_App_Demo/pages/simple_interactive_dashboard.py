@@ -14,7 +14,7 @@
 
 import dash
 from dash import html, dcc, callback, Output, Input
-from data_import import df_curr_enrollment
+from data_import import df_curr_enrollment, figure_cache
 import plotly.express as px
 import dash_bootstrap_components as dbc
 
@@ -79,7 +79,10 @@ layout = dbc.Container([
 )
 
 # The following function uses the Input values specified above
-# to update the chart shown within this page.
+# to update the chart shown within this page. (The @figure_cache.memoize()
+# decorator allows charts that have already been created for a given
+# set of inputs to be reused; see figure_cache.py for more details.)
+@figure_cache.memoize()
 def display_graph(pivot_index, college_filter, level_filter):
     
     # Filtering a copy of df_curr_enrollment to include only the filter
@@ -25,65 +25,208 @@
 # https://dash-bootstrap-components.opensource
 # .faculty.ai/docs/components/layout/ .
 
+import os
+import hashlib
 import gspread
 
-# From https://pypi.org/project/gspread-dataframe/
-from gspread_dataframe import get_as_dataframe
-
-from dash import Dash, html, dcc, dash_table, callback, Input, Output
+from dash import (Dash, html, dcc, dash_table, callback, Input, Output,
+                  ctx, no_update)
 import plotly.express as px
 import pandas as pd
+import numpy as np
 import dash_bootstrap_components as dbc
 from datetime import datetime, timedelta
-
-print("Initializing gspread using service account key stored within \
+# See data_store.py for more information on these classes:
+from data_store import (GoogleSheetsStore, ParquetStore, SQLiteStore,
+                        SnapshotRefresher)
+# See downsampling.py for more information on this function:
+from downsampling import downsample_series
+# See figure_cache.py for more information on this class:
+from figure_cache import FigureCache
+
+# The WEATHER_DATA_STORE environment variable determines where the
+# app will import its data from. 'google_sheets' (the default) is 
+# used within Cloud Run. 'parquet' and 'sqlite' allow data to get 
+# imported from local files published by updating_online_spreadsheets.py
+# (with its publish_store_type variable set to the same value), which 
+# can help save time when debugging. WEATHER_DATA_PATH can be used to
+# specify the location of these files.
+data_store_type = os.environ.get('WEATHER_DATA_STORE', 'google_sheets')
+local_data_folder = '../../Updating_Online_Spreadsheets/weather_data'
+
+if data_store_type == 'google_sheets':
+    print("Initializing gspread using service account key stored within \
 Cloud Run secrets volume:")
-
-
-local_data_import = False # This allows data to get imported from local
-# .csv files, which can help save time when debugging. It must be 
-# set to False prior to exporting the app to Cloud Run, however.
-
-if local_data_import == False:
 # Guillaume Blaquiere's post at 
 # https://stackoverflow.com/a/68536068/13097194 
 # was helpful in drafting the following line. 
 
+    # Note: the following line will only run successfully when the app
+    # is deployed to Cloud Run. That's because the file path is 
+    # actually a volume within my Cloud Run container.
+    # (See the readme for further details on successfully running
+    # this code on your end.)
     gc = gspread.service_account(
     filename = '/svcacctsecret/kjb3server_service_account')
     wb = gc.open_by_key('17aDJ3mg49-n0IEnDgN7ZB85pO87fiUpkZPULYDB8dmo')
-
-# Note: the code above will only run successfully when the app is
-# deployed to Cloud Run. That's because the file path is actually a volume
-# within my Cloud Run container.
-# (See the readme for further details on successfully running
-# this code on your end.)
-
-# Importing data from each spreadsheet:
-wx_df_list = []
-
-for station in ['KCHO', 'KIAD', 'KOKV']:
-    if local_data_import == True:
-        wx_df_list.append(pd.read_csv(f'../../Updating_Online_\
-Spreadsheets/weather_data/{station}_historical_hourly_data_\
-updated.csv')[-960:])
-    else:
-        ws = wb.worksheet(station)
-        wx_df_list.append(get_as_dataframe(ws)[-960:]) # Importing up to
+    data_store = GoogleSheetsStore(wb)
+elif data_store_type == 'parquet':
+    data_store = ParquetStore(os.environ.get(
+        'WEATHER_DATA_PATH', local_data_folder+'/published'))
+elif data_store_type == 'sqlite':
+    data_store = SQLiteStore(os.environ.get(
+        'WEATHER_DATA_PATH', 
+        local_data_folder+'/published_weather_data.db'))
+else:
+    raise ValueError(f"Unknown data store type: {data_store_type}")
+
+def load_weather_data():
+    '''Imports the latest data for each station, then combines it into
+    a single DataFrame.'''
+    # Importing data for each station: (When Google Sheets is being 
+    # used, all three worksheets will be read via a single API call.)
+    wx_df_dict = data_store.read_tables(['KCHO', 'KIAD', 'KOKV'])
+    wx_df_list = []
+
+    for station in ['KCHO', 'KIAD', 'KOKV']:
+        wx_df_list.append(wx_df_dict[station][-960:]) # Importing up to
         # 40 days of data for each station (in order to keep the charts
         # readable) . The sheets may already only show 40 days' worth
-        # of data, but it won't hurt to keep the [-960:] filter in place
-        # in case their format changes in the future.
-
-# Combining these station-specific tables into a single DataFrame:
-
-df_wx = pd.concat([df for df in wx_df_list])
+        # of data, but it won't hurt to keep the [-960:] filter in 
+        # place in case their format changes in the future.
+
+    # Combining these station-specific tables into a single DataFrame:
+
+    df_wx = pd.concat([df for df in wx_df_list])
+
+    df_wx['Date/Time'] = pd.to_datetime(df_wx['Date/Time'])
+    print(df_wx.tail())
+    return index_weather_data(df_wx)
+
+
+def index_weather_data(df_wx):
+    '''This function sorts df_wx by station and date/time, then returns
+    a dictionary containing (1) this sorted DataFrame; (2) a NumPy 
+    array of its date/time values; (3) a dictionary that maps each 
+    station to the first and last (exclusive) positions of its rows 
+    within the DataFrame; and (4) the version of this data. Items 2 and
+    3 allow slice_weather_data() to locate the rows needed for a given
+    graph via binary searches rather than by scanning the entire 
+    DataFrame.'''
+    # Rows with missing dates would otherwise be sorted to the end of
+    # each station's rows, so they're removed here. (They wouldn't
+    # have been displayed within the graph anyway.)
+    df_wx = df_wx.dropna(subset = ['Date/Time']).sort_values(
+        ['Station', 'Date/Time'], kind = 'stable').reset_index(drop=True)
+    stations = df_wx['Station'].astype('str').to_numpy()
+    # Finding the positions at which each station's rows begin: 
+    # (Since the rows are sorted by station, each station's rows will
+    # be adjacent to one another.)
+    station_starts = np.flatnonzero(
+        np.r_[True, stations[1:] != stations[:-1]])
+    station_stops = np.r_[station_starts[1:], len(stations)]
+    station_bounds = {stations[start]:(start, stop) for start, stop in 
+                      zip(station_starts, station_stops)}
+    return {'df_wx':df_wx, 
+            'date_times':df_wx['Date/Time'].to_numpy(),
+            'station_bounds':station_bounds,
+            'version':get_data_version(df_wx)}
+
+
+def get_data_version(df_wx):
+    '''Returns a tuple containing (1) the most recent date/time value 
+    within df_wx (as a string) and (2) a hash of df_wx's contents. 
+    Every gunicorn worker that loads the same data will calculate
+    the same version, so figure_cache can safely share graphs between
+    them. In addition, since newer data will generally end at a later
+    time, newer versions will be greater than older ones.'''
+    latest_date_time = str(df_wx['Date/Time'].max())
+    content_hash = hashlib.sha256(pd.util.hash_pandas_object(
+        df_wx, index = False).to_numpy().tobytes()).hexdigest()[:24]
+    return (latest_date_time, content_hash)
+
+
+def slice_weather_data(weather_data, station_list, data_cutoff, 
+                       data_end = None):
+    '''Returns the rows within weather_data (the output of 
+    index_weather_data()) for the stations in station_list whose 
+    date/time values are greater than or equal to data_cutoff (and, if
+    data_end is specified, less than or equal to data_end). Only one
+    or two binary searches (via np.searchsorted()) are needed per 
+    station, so the time this function takes won't increase much as
+    more data gets added to the app.'''
+    date_times = weather_data['date_times']
+    cutoff = np.datetime64(data_cutoff).astype(date_times.dtype)
+    positions = []
+    # Stations are added in alphabetical order so that the graph's 
+    # colors and legend won't depend on the order in which they were
+    # selected.
+    for station, (start, stop) in sorted(
+        weather_data['station_bounds'].items()):
+        if station in station_list:
+            first_position = start + np.searchsorted(
+                date_times[start:stop], cutoff, side = 'left')
+            last_position = stop
+            if data_end is not None:
+                last_position = start + np.searchsorted(
+                    date_times[start:stop], np.datetime64(
+                        data_end).astype(date_times.dtype), side = 'right')
+            positions.append(np.arange(first_position, last_position))
+    if len(positions) == 0:
+        return weather_data['df_wx'].iloc[0:0]
+    return weather_data['df_wx'].iloc[np.concatenate(positions)]
+
+
+# Earlier versions of this app imported the weather data only once
+# (when the app started up), so an instance of the app that ran for a
+# long time would continue to show outdated data. The following code 
+# instead reloads this data within a background thread every 
+# WEATHER_REFRESH_SECONDS seconds (10 minutes by default) if the data
+# has changed. Since this data is loaded in the background, the app can
+# start up--and its callbacks can run--without waiting for it.
+refresher = SnapshotRefresher(
+    load_weather_data, version_function = data_store.get_version,
+    refresh_seconds = int(os.environ.get(
+        'WEATHER_REFRESH_SECONDS', 600))).start()
+
+# Downsampling settings: Each station's line will contain at most
+# WEATHER_MAX_POINTS points. (40 days of hourly data amounts to 960 
+# points per station, so the graph will only get downsampled if more 
+# data is added to the app--e.g. if 20-minute KOKV observations are 
+# displayed.) WEATHER_DOWNSAMPLING can be set to 'lttb' (the default),
+# 'minmax', or 'none' (which disables downsampling).
+max_points_per_station = int(os.environ.get('WEATHER_MAX_POINTS', 1000))
+downsampling_method = os.environ.get('WEATHER_DOWNSAMPLING', 'lttb')
+
+
+def get_zoom_range(relayout_data):
+    '''Returns the start and end of the x axis range that the user 
+    zoomed in on (based on the graph's relayoutData property), 'reset' 
+    if the user reset the axes, or None if the x axis wasn't
+    changed.'''
+    if not relayout_data:
+        return None
+    if relayout_data.get('xaxis.autorange') == True:
+        return 'reset'
+    if 'xaxis.range[0]' in relayout_data:
+        return (pd.Timestamp(relayout_data['xaxis.range[0]']),
+                pd.Timestamp(relayout_data['xaxis.range[1]']))
+    if 'xaxis.range' in relayout_data:
+        return (pd.Timestamp(relayout_data['xaxis.range'][0]),
+                pd.Timestamp(relayout_data['xaxis.range'][1]))
+    return None
+
+
+# Graphs that have already been created for a given set of inputs (and
+# a given copy of the weather data) will be reused rather than 
+# recreated. Setting the FIGURE_CACHE_FOLDER environment variable allows
+# these graphs to be shared across gunicorn workers. (Each graph's
+# version is taken from the snapshot that create_weather_graph() 
+# receives; see below.)
+figure_cache = FigureCache(
+    max_entries = int(os.environ.get('FIGURE_CACHE_ENTRIES', 256)),
+    disk_folder = os.environ.get('FIGURE_CACHE_FOLDER'))
 
-df_wx['Date/Time'] = pd.to_datetime(df_wx['Date/Time'])
-print(df_wx.tail())
-
-
-current_date = datetime.today()
 
 app=Dash(external_stylesheets = [dbc.themes.BOOTSTRAP])
 server = app.server
@@ -163,12 +306,63 @@ dbc.Row(dcc.Markdown("By Kenneth Burchfiel"))])
     Output('fig', 'figure'),
     Input('metric', 'value'),
     Input('station_list', 'value'),
-    Input('days_to_include', 'value'))
+    Input('days_to_include', 'value'),
+    Input('fig', 'relayoutData'))
+
+def plot_graph(metric, station_list, days_to_include, relayout_data):
+    # Retrieving the most recent snapshot of the weather data: (Storing
+    # this snapshot within a local variable ensures that the same data
+    # will be used throughout this function--and used to determine the
+    # graph's cache key--even if the background thread replaces it in
+    # the meantime.)
+    snapshot = refresher.snapshot
+    if snapshot is None:
+        return px.line(title="The weather data is still loading. Please \
+refresh this page in a few seconds.")
 
-def plot_graph(metric, station_list, days_to_include):
     # Determining the earliest point at which data should be displayed:
-    data_cutoff = str(current_date - timedelta(
-        days=days_to_include))
+    # (This cutoff is calculated each time the function runs so that
+    # it will remain accurate no matter how long the app has been
+    # running. It's rounded down to the start of the hour so that 
+    # graphs created within the same hour can be retrieved from
+    # figure_cache.)
+    data_cutoff = (datetime.today() - timedelta(
+        days=days_to_include)).replace(minute=0, second=0, microsecond=0)
+
+    # If this function was called because the user zoomed in on (or
+    # panned across) the graph, only the visible portion of the data 
+    # will be retrieved. Since this portion will generally contain 
+    # fewer points than the full graph, it will be downsampled less
+    # heavily (or not at all), thus allowing users to view the original
+    # data by zooming in. (Other relayout events, such as changes to 
+    # the y axis alone, don't require the graph to be recreated.)
+    zoom_range = None
+    if ctx.triggered_id == 'fig':
+        zoom_range = get_zoom_range(relayout_data)
+        if zoom_range is None:
+            return no_update
+        if zoom_range == 'reset':
+            zoom_range = None
+    return create_weather_graph(
+        snapshot, metric, station_list, days_to_include, data_cutoff, 
+        zoom_range)
+
+
+@figure_cache.memoize(
+    argument_version_function = lambda snapshot: (
+        snapshot['data']['version']))
+def create_weather_graph(snapshot, metric, station_list, 
+                         days_to_include, data_cutoff, zoom_range):
+    '''Creates the weather graph displayed by plot_graph() using the 
+    data within snapshot (a snapshot created by refresher). zoom_range
+    is either None (in which case all data after data_cutoff will be
+    shown) or the start and end of the range that the user zoomed in 
+    on.'''
+    weather_data = snapshot['data']
+    data_end = None
+    if zoom_range is not None:
+        data_cutoff = max(data_cutoff, zoom_range[0])
+        data_end = zoom_range[1]
 
     # Modifying the title so that it's grammatically correct when
     # only one day of data is being displayed:
@@ -177,9 +371,15 @@ def plot_graph(metric, station_list, days_to_include):
     else:
         day_title_component = f'Last {days_to_include} Days'
     
+    df_graph = slice_weather_data(
+        weather_data, station_list, data_cutoff, data_end)
+    df_graph = downsample_series(
+        df_graph, x_col = 'Date/Time', y_col = metric, 
+        group_col = 'Station', max_points = max_points_per_station,
+        method = downsampling_method)
+
     fig = px.line(
-        df_wx.query("(Station in @station_list) \
-    & (`Date/Time` >= @data_cutoff)"), 
+        df_graph, 
         x='Date/Time', y=metric,
         color='Station',
         title=f"{metric} Over {day_title_component}")
@@ -192,6 +392,10 @@ def plot_graph(metric, station_list, days_to_include):
         fig.update_layout(yaxis_title='Windspeed (mph)')
     if 'Precip' in metric:
         fig.update_layout(yaxis_title='Precipitation (in.)')
+    # Keeping the zoomed-in range in place: (Otherwise, the x axis 
+    # would be rescaled to fit the retrieved data.)
+    if zoom_range is not None:
+        fig.update_xaxes(range = [zoom_range[0], zoom_range[1]])
     return fig
 
 
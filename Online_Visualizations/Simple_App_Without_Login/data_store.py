@@ -0,0 +1,317 @@
+# Weather Data Stores
+# By Kenneth Burchfiel
+# Released under the MIT License
+
+# This Python file defines several interchangeable 'stores' for the
+# weather data that updating_online_spreadsheets.py (within the
+# Updating_Online_Spreadsheets section of PFN) publishes and that this
+# folder's Dash app displays. Each store offers the same two methods:
+
+# write_tables(df_dict): saves each DataFrame within df_dict (a
+# dictionary whose keys are table names, such as 'KCHO', and whose
+# values are DataFrames).
+
+# read_tables(names): returns a dictionary of DataFrames for the
+# tables whose names are listed within names.
+
+# get_version(): returns a value that changes whenever the store's
+# data changes (or None if this can't be determined). This allows
+# the SnapshotRefresher class at the bottom of this file to skip 
+# reloading data that hasn't changed.
+
+# As a result, the app and the publishing script can switch from
+# Google Sheets to a local Parquet folder, a SQLite database, or an
+# in-memory store by changing a single line of code. (The local and
+# in-memory options are particularly useful for testing and
+# benchmarking the full import --> publish --> dashboard process
+# without a Google Cloud service account.)
+
+import os
+import time
+import sqlite3
+import threading
+from contextlib import closing
+import pandas as pd
+from datetime import datetime
+
+def convert_values_to_dataframe(values):
+    '''Converts a list of rows returned by the Google Sheets API (the
+    first of which is a header row) into a DataFrame.'''
+    if len(values) == 0:
+        return pd.DataFrame()
+    header = values[0]
+    # Google Sheets leaves out empty cells at the end of each row and
+    # returns other empty cells as empty strings; both are converted
+    # to missing values here.
+    rows = [[None if value == '' else value for value in row]
+            + [None] * (len(header) - len(row)) for row in values[1:]]
+    # infer_objects() converts columns of numbers (which will
+    # initially have an 'object' data type due to the presence of
+    # None values) to numeric columns.
+    return pd.DataFrame(rows, columns = header).infer_objects()
+
+
+class GoogleSheetsStore:
+    '''This store reads tables from, and writes them to, worksheets
+    within a Google Sheets workbook. Each table is stored within the
+    worksheet with the same name.
+
+    wb: a gspread Spreadsheet object (e.g. the output of
+    gc.open_by_key()).
+
+    manifest_folder: the folder in which sheets_sync.py will save each
+    worksheet's manifest. (This is only needed when writing tables.)
+
+    max_rows: the number of most recent rows from each DataFrame that
+    will be written to its worksheet.
+    '''
+
+    def __init__(self, wb, manifest_folder = '', max_rows = 960):
+        self.wb = wb
+        self.manifest_folder = manifest_folder
+        self.max_rows = max_rows
+
+    def read_tables(self, names):
+        '''Reads all of the requested worksheets via a single API
+        call.'''
+        # Numbers are returned unformatted (so that they don't need to
+        # be converted from strings), but dates are returned as
+        # strings (rather than as serial numbers).
+        response = self.wb.values_batch_get(
+            [f"'{name}'" for name in names],
+            params = {'valueRenderOption':'UNFORMATTED_VALUE',
+                      'dateTimeRenderOption':'FORMATTED_STRING'})
+        return {name:convert_values_to_dataframe(
+            value_range.get('values', []))
+                for name, value_range in zip(
+                    names, response['valueRanges'])}
+
+    def write_tables(self, df_dict):
+        '''Uploads new and changed rows to each worksheet via
+        sync_dataframes_to_workbook(), then returns that function's
+        summary of the upload.'''
+        # sheets_sync.py is stored within the Updating_Online_
+        # Spreadsheets folder (which also contains the script that
+        # publishes this data). It's imported here, rather than at the
+        # top of this file, so that the Dash app (which only reads
+        # data) doesn't need access to it.
+        from sheets_sync import sync_dataframes_to_workbook
+        return sync_dataframes_to_workbook(
+            self.wb, df_dict, self.manifest_folder,
+            max_rows = self.max_rows)
+
+    def get_version(self):
+        '''Returns the time at which the workbook was last updated
+        (according to Google Drive), or None if this time isn't
+        available.'''
+        try:
+            return self.wb.get_lastUpdateTime()
+        except Exception:
+            return None
+
+
+class ParquetStore:
+    '''This store saves each table as a Parquet file (e.g. KCHO.parquet)
+    within a local folder. Parquet files preserve each column's data
+    type and can be read in much faster than .csv files.
+
+    folder: the folder in which tables will be stored. (It will get
+    created if it doesn't exist already.)
+
+    max_rows: the number of most recent rows from each DataFrame that
+    will be saved. Set to None to save all rows.
+    '''
+
+    def __init__(self, folder, max_rows = None):
+        self.folder = folder
+        self.max_rows = max_rows
+        os.makedirs(folder, exist_ok = True)
+
+    def read_tables(self, names):
+        return {name:pd.read_parquet(
+            os.path.join(self.folder, f'{name}.parquet'))
+                for name in names}
+
+    def write_tables(self, df_dict):
+        for name, df in df_dict.items():
+            path = os.path.join(self.folder, f'{name}.parquet')
+            # Writing to a temporary file, then renaming it, ensures
+            # that the app won't read a partially written file.
+            trim_rows(df, self.max_rows).to_parquet(
+                path + '.tmp', index = False)
+            os.replace(path + '.tmp', path)
+        return {name:len(trim_rows(df, self.max_rows))
+                for name, df in df_dict.items()}
+
+    def get_version(self):
+        '''Returns the most recent modification time of any Parquet
+        file within the folder.'''
+        return max((entry.stat().st_mtime 
+                    for entry in os.scandir(self.folder)
+                    if entry.name.endswith('.parquet')), default = None)
+
+
+class SQLiteStore:
+    '''This store saves each table within a SQLite database.
+
+    db_path: the path to the database. (It will get created if it
+    doesn't exist already.)
+
+    max_rows: the number of most recent rows from each DataFrame that
+    will be saved. Set to None to save all rows.
+    '''
+
+    def __init__(self, db_path, max_rows = None):
+        self.db_path = db_path
+        self.max_rows = max_rows
+
+    def read_tables(self, names):
+        # (closing() ensures that the connection gets closed once the
+        # tables have been read; a 'with sqlite3.connect()' block would
+        # only commit or roll back its transaction.)
+        with closing(sqlite3.connect(self.db_path)) as con:
+            return {name:pd.read_sql(f'SELECT * FROM "{name}"', con)
+                    for name in names}
+
+    def write_tables(self, df_dict):
+        # to_sql() commits each table separately, so the new copies of
+        # the tables are first written to temporary tables. These 
+        # temporary tables then replace the originals within a single
+        # transaction, so the app will either see the previous copy of
+        # every table or the new one.
+        with closing(sqlite3.connect(self.db_path)) as con:
+            for name, df in df_dict.items():
+                trim_rows(df, self.max_rows).to_sql(
+                    f'{name}_new', con, if_exists = 'replace', 
+                    index = False)
+            con.execute('BEGIN')
+            with con: # Commits the transaction (or rolls it back if 
+                # an error occurs)
+                for name in df_dict.keys():
+                    con.execute(f'DROP TABLE IF EXISTS "{name}"')
+                    con.execute(
+                        f'ALTER TABLE "{name}_new" RENAME TO "{name}"')
+        return {name:len(trim_rows(df, self.max_rows))
+                for name, df in df_dict.items()}
+
+    def get_version(self):
+        if not os.path.exists(self.db_path):
+            return None
+        return os.path.getmtime(self.db_path)
+
+
+class MemoryStore:
+    '''This store keeps copies of each table in memory. It can be used
+    to test or benchmark the publishing script and the Dash app within
+    a single Python process.
+
+    max_rows: the number of most recent rows from each DataFrame that
+    will be saved. Set to None to save all rows.
+    '''
+
+    def __init__(self, max_rows = None):
+        self.max_rows = max_rows
+        self.tables = {}
+        self.write_count = 0
+
+    def read_tables(self, names):
+        return {name:self.tables[name].copy() for name in names}
+
+    def write_tables(self, df_dict):
+        for name, df in df_dict.items():
+            self.tables[name] = trim_rows(df, self.max_rows).reset_index(
+                drop=True)
+        self.write_count += 1
+        return {name:len(self.tables[name]) for name in df_dict.keys()}
+
+    def get_version(self):
+        return self.write_count
+
+
+def trim_rows(df, max_rows):
+    '''Returns the last max_rows rows of df (or all of df if max_rows is
+    None).'''
+    if max_rows is None:
+        return df.copy()
+    return df.iloc[-max_rows:].copy()
+
+
+class SnapshotRefresher:
+    '''This class keeps an in-memory 'snapshot' of data up to date by
+    reloading it within a background thread. This allows a Dash app to
+    show recent data without having to be restarted, and without its
+    callbacks ever having to wait for data to be imported.
+
+    load_function: a function (with no arguments) that imports the data
+    and returns it.
+
+    version_function: an optional function (such as a store's 
+    get_version() method) whose output changes whenever the underlying
+    data changes. If its output hasn't changed since the last load, the
+    data won't be reloaded. If this function isn't provided (or returns
+    None), the data will be reloaded every refresh_seconds seconds.
+
+    refresh_seconds: the number of seconds to wait between checks for
+    new data.
+
+    The current snapshot can be accessed via the snapshot attribute,
+    which will be None until the first load has finished. Each 
+    snapshot is a dictionary with the following keys:
+    'data': the output of load_function.
+    'snapshot_id': a number that increases by 1 with each load. (This 
+    can be used to determine whether cached results are still valid.)
+    'loaded_at': the time at which the data was loaded.
+    '''
+
+    def __init__(self, load_function, version_function = None,
+                 refresh_seconds = 600):
+        self.load_function = load_function
+        self.version_function = version_function
+        self.refresh_seconds = refresh_seconds
+        self.snapshot = None
+        self.source_version = None
+        self.thread = None
+
+    def refresh(self):
+        '''Reloads the data if it has changed (or if its version can't
+        be determined). Returns True if a new snapshot was created and 
+        False otherwise.'''
+        source_version = None
+        if self.version_function is not None:
+            source_version = self.version_function()
+        if ((self.snapshot is not None) and (source_version is not None)
+            and (source_version == self.source_version)):
+            return False
+        data = self.load_function()
+        if self.snapshot is None:
+            snapshot_id = 1
+        else:
+            snapshot_id = self.snapshot['snapshot_id'] + 1
+        # Replacing the entire snapshot dictionary at once (rather than
+        # updating its values one by one) ensures that other threads 
+        # will always see either the previous snapshot or the new one.
+        self.snapshot = {'data':data, 'snapshot_id':snapshot_id,
+                         'loaded_at':datetime.now()}
+        self.source_version = source_version
+        return True
+
+    def run(self):
+        while True:
+            # If an error occurs (e.g. because the store couldn't be 
+            # reached), the previous snapshot will remain in place.
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Data couldn't be refreshed due to the following \
+error: {e}")
+            time.sleep(self.refresh_seconds)
+
+    def start(self):
+        '''Starts refreshing the data within a background thread. 
+        (Because this thread is a daemon thread, it won't prevent the 
+        app from shutting down.)'''
+        if self.thread is None:
+            self.thread = threading.Thread(target = self.run, 
+                                           daemon = True)
+            self.thread.start()
+        return self
@@ -0,0 +1,124 @@
+# Time Series Downsampling
+# By Kenneth Burchfiel
+# Released under the MIT License
+
+# This Python file reduces the number of points within long time series
+# so that they can be sent to (and rendered by) a browser more quickly.
+# Two methods are available:
+
+# 1. Largest-Triangle-Three-Buckets (LTTB), which splits a series into
+# buckets and keeps the point within each bucket that forms the largest
+# triangle with the points kept before and after it. This approach
+# preserves the visual shape of a line chart well. It was developed by
+# Sveinn Steinarsson; see https://skemman.is/handle/1946/15343 for
+# more details.
+
+# 2. Min/max downsampling, which keeps the lowest and highest points
+# within each bucket. This approach guarantees that peaks (e.g. the
+# highest rolling precipitation total) will remain visible.
+
+import numpy as np
+
+def lttb_indices(x, y, point_count):
+    '''Returns the positions of the points within x and y that the LTTB
+    algorithm selects. x and y should be NumPy arrays of the same length
+    (with x sorted in ascending order), and point_count is the number of
+    points to keep. The first and last points are always kept.'''
+    n = len(x)
+    if (point_count >= n) or (point_count < 3):
+        return np.arange(n)
+    x = x.astype('float64')
+    y = y.astype('float64')
+    # Splitting the points between the first and last points into
+    # point_count - 2 buckets: (bucket_edges[i] and bucket_edges[i+1]
+    # mark the start and end of bucket i.)
+    bucket_edges = np.linspace(1, n - 1, point_count - 1).astype('int')
+    selected = np.empty(point_count, dtype = 'int')
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(point_count - 2):
+        start, stop = bucket_edges[i], bucket_edges[i + 1]
+        # Finding the average point within the next bucket: (The last
+        # point serves as the 'next bucket' for the final bucket.)
+        if i + 2 < len(bucket_edges):
+            next_start, next_stop = bucket_edges[i + 1], bucket_edges[i + 2]
+        else:
+            next_start, next_stop = n - 1, n
+        average_x = x[next_start:next_stop].mean()
+        average_y = y[next_start:next_stop].mean()
+        # Calculating (twice) the area of the triangle formed by the
+        # previously selected point, each point within this bucket, and
+        # the average point within the next bucket:
+        areas = np.abs(
+            (x[previous] - average_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (average_y - y[previous]))
+        previous = start + np.argmax(areas)
+        selected[i + 1] = previous
+    return selected
+
+
+def minmax_indices(y, point_count):
+    '''Returns the positions of the lowest and highest values of y
+    within each of (point_count - 2) / 2 equally sized buckets (in
+    ascending order). The first and last points are always kept, so at
+    most point_count positions will be returned.'''
+    n = len(y)
+    if (point_count >= n) or (point_count < 4):
+        return np.arange(n)
+    bucket_edges = np.linspace(0, n, (point_count - 2) // 2 + 1).astype(
+        'int')
+    selected = [0, n - 1]
+    for start, stop in zip(bucket_edges[:-1], bucket_edges[1:]):
+        if stop > start:
+            selected.append(start + np.argmin(y[start:stop]))
+            selected.append(start + np.argmax(y[start:stop]))
+    return np.unique(selected)
+
+
+def downsample_series(df, x_col, y_col, group_col, max_points,
+                      method = 'lttb'):
+    '''This function reduces each group's rows within df (e.g. each
+    station's weather observations) to at most max_points rows using
+    the specified method ('lttb' or 'minmax'). Groups with max_points
+    or fewer rows are returned in full.
+
+    df should be sorted by group_col and then by x_col, with each
+    group's rows adjacent to one another. (The output of
+    slice_weather_data() within app.py meets these criteria.) 
+
+    The methods above can't handle missing y_col values, so only the
+    first row of each run of missing values is kept within groups that
+    get downsampled. (These rows ensure that the downsampled line will
+    break at the same gaps as the original one.) The remaining rows 
+    are selected from the non-missing values, with max_points reduced 
+    by the number of gaps so that the total stays within max_points
+    (unless the group has a very large number of gaps).'''
+    if (method not in ['lttb', 'minmax']) or (len(df) <= max_points):
+        return df
+    groups = df[group_col].astype('str').to_numpy()
+    group_starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    group_stops = np.r_[group_starts[1:], len(groups)]
+    x_values = df[x_col].to_numpy()
+    if np.issubdtype(x_values.dtype, np.datetime64):
+        x_values = x_values.astype('int64')
+    y_values = df[y_col].to_numpy(dtype = 'float64', na_value = np.nan)
+
+    positions = []
+    for start, stop in zip(group_starts, group_stops):
+        if stop - start <= max_points:
+            positions.append(np.arange(start, stop))
+            continue
+        is_missing = np.isnan(y_values[start:stop])
+        group_positions = start + np.flatnonzero(~is_missing)
+        gap_positions = start + np.flatnonzero(
+            is_missing & ~np.r_[False, is_missing[:-1]])
+        point_count = max(max_points - len(gap_positions), 4)
+        if method == 'lttb':
+            kept = lttb_indices(x_values[group_positions],
+                                y_values[group_positions], point_count)
+        else:
+            kept = minmax_indices(y_values[group_positions], point_count)
+        positions.append(np.sort(np.concatenate(
+            [group_positions[kept], gap_positions])))
+    return df.iloc[np.concatenate(positions)]
@@ -0,0 +1,504 @@
+# Google Sheets Sync
+# By Kenneth Burchfiel
+# Released under the MIT license
+
+# This Python file allows a DataFrame to be copied to a Google Sheets
+# worksheet without clearing and rewriting the entire worksheet each
+# time. Instead, a 'manifest' file stores a hash of each row that the
+# worksheet currently contains. When the DataFrame is next exported,
+# only rows that are new or whose contents have changed will get
+# uploaded; rows that have fallen out of the trailing window (e.g. the
+# most recent 960 rows) will get deleted from the top of the worksheet.
+
+# All of these changes are sent within a single batch_update() call.
+# Because Google Sheets applies each batch update all at once, apps
+# that read from the worksheet will never see it in an empty or
+# partially updated state (as they could have between ws.clear() and
+# set_with_dataframe() calls). sync_dataframes_to_workbook() goes a
+# step further by combining the updates for multiple worksheets into
+# a single call, and verify_worksheets() reads all of these worksheets
+# back within a single call as well.
+
+# The LocalSpreadsheet class at the bottom of this file mimics the parts
+# of the Google Sheets API that these functions use. It can be used in 
+# place of a gspread Spreadsheet object when trying out this code 
+# without a Google Cloud service account.
+
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+# Google Sheets stores dates and times as 'serial numbers' (the number
+# of days since December 30, 1899), which allows them to be sorted,
+# filtered, and used within formulas. Datetime columns are therefore
+# uploaded as serial numbers along with the following format, which 
+# displays them as 'YYYY-MM-DD HH:MM:SS' values.
+serial_number_epoch = pd.Timestamp('1899-12-30')
+date_time_format = {'type':'DATE_TIME', 'pattern':'yyyy-mm-dd hh:mm:ss'}
+
+def convert_cell_value(value):
+    '''Converts a single DataFrame value into a Python value that can
+    be sent to the Google Sheets API. Missing values are returned as
+    None.'''
+    if (value is None) or ((not isinstance(value, str)) and
+                           pd.isna(value)):
+        return None
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        # Converting the value to a string first ensures that float32
+        # values like 0.3 won't get uploaded as 0.30000001192092896.
+        value = float(str(value))
+        # Google Sheets returns whole numbers as integers, so they're 
+        # stored that way here as well. (This allows rows read back 
+        # from a worksheet to be compared with the original rows.)
+        if value.is_integer():
+            return int(value)
+        return value
+    return str(value)
+
+
+def create_sheet_rows(df):
+    '''Converts df into a header row (a list of column names) and a
+    list of data rows, each of which is a list of values created by
+    convert_cell_value().'''
+    columns = []
+    for column in df.columns:
+        # Converting datetime columns to serial numbers: (see the top
+        # of this file)
+        if pd.api.types.is_datetime64_any_dtype(df[column]):
+            date_times = df[column]
+            if date_times.dt.tz is not None:
+                date_times = date_times.dt.tz_localize(None)
+            values = ((date_times - serial_number_epoch) 
+                      / pd.Timedelta(days = 1)).to_numpy()
+        else:
+            values = df[column].to_numpy()
+        columns.append([convert_cell_value(value) for value in values])
+    header = [str(column) for column in df.columns]
+    rows = [list(row) for row in zip(*columns)]
+    return header, rows
+
+
+def hash_row(row):
+    '''Returns a short hash of a row's values.'''
+    return hashlib.sha256(json.dumps(row).encode('utf-8')).hexdigest()[
+        :16]
+
+
+def load_manifest(manifest_path):
+    '''Returns the manifest saved at manifest_path, or None if no
+    manifest has been saved there yet.'''
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as file:
+        return json.load(file)
+
+
+def save_manifest(manifest_path, manifest):
+    with open(manifest_path + '.tmp', 'w') as file:
+        json.dump(manifest, file)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+
+def get_date_time_positions(df):
+    '''Returns the positions of df's datetime columns.'''
+    return [position for position, column in enumerate(df.columns)
+            if pd.api.types.is_datetime64_any_dtype(df[column])]
+
+
+def create_cell_data(value, is_date_time = False):
+    '''Converts a value into the CellData format used by the Google
+    Sheets API's updateCells request. (An empty dictionary will clear
+    the cell.) If is_date_time is True, value should be a serial number
+    (see create_sheet_rows()), and the cell will be formatted as a 
+    date and time.'''
+    if value is None:
+        return {}
+    if isinstance(value, bool):
+        return {'userEnteredValue':{'boolValue':value}}
+    if isinstance(value, (int, float)):
+        if is_date_time == True:
+            return {'userEnteredValue':{'numberValue':value},
+                    'userEnteredFormat':{'numberFormat':date_time_format}}
+        return {'userEnteredValue':{'numberValue':value}}
+    return {'userEnteredValue':{'stringValue':value}}
+
+
+def create_update_request(sheet_id, start_row_index, rows, 
+                          date_time_positions = []):
+    '''Returns an updateCells request that will write rows to the
+    worksheet starting at start_row_index (a 0-based index, so the
+    header row is at index 0). Values at the positions listed within
+    date_time_positions will be formatted as dates and times. (Number
+    formats are included within the request's fields so that cells 
+    that no longer contain dates and times will lose this format.)'''
+    return {'updateCells':{
+        'start':{'sheetId':sheet_id, 'rowIndex':start_row_index,
+                 'columnIndex':0},
+        'rows':[{'values':[
+            create_cell_data(value, position in date_time_positions) 
+            for position, value in enumerate(row)]} for row in rows],
+        'fields':'userEnteredValue,userEnteredFormat.numberFormat'}}
+
+
+def create_sync_requests(sheet_id, df, manifest, 
+                         key_columns = ['Date', 'Time'], 
+                         max_rows = 960, full_sync = False):
+    '''This function compares the last max_rows rows of df with the 
+    rows that a worksheet currently contains (as recorded within its
+    manifest), then creates the batch_update requests needed to bring
+    the worksheet up to date. Only rows that are new or whose contents
+    have changed will be included within these requests.
+
+    sheet_id: the worksheet's ID (e.g. ws.id within gspread).
+
+    manifest: the dictionary that load_manifest() returned for this 
+    worksheet (or None if no manifest exists yet).
+
+    key_columns: the columns that uniquely identify each row. These
+    allow the function to determine how many rows have fallen out of
+    the trailing window since the last sync.
+
+    full_sync: set to True to rewrite the entire worksheet (e.g. if it
+    was edited by hand and thus no longer matches the manifest). A
+    full sync will also take place if no manifest exists yet or if
+    df's columns have changed.
+
+    The function returns a list of requests; the worksheet's updated 
+    manifest (which should be saved once these requests have been 
+    sent); and a dictionary showing how many rows will get deleted from
+    the top of the worksheet and how many will be uploaded.'''
+    df = df.iloc[-max_rows:]
+    header, rows = create_sheet_rows(df)
+    date_time_positions = get_date_time_positions(df)
+    key_rows = create_sheet_rows(df[key_columns])[1]
+    keys = [hash_row(key_row) for key_row in key_rows]
+    row_hashes = [hash_row(row) for row in rows]
+
+    if (full_sync == True) or (manifest is None) or (
+        manifest['header'] != header):
+        previous_keys, previous_hashes = [], []
+        rewrite_header = True
+    else:
+        previous_keys = manifest['keys']
+        previous_hashes = manifest['row_hashes']
+        rewrite_header = False
+
+    # Determining how many rows at the top of the worksheet are no
+    # longer part of the trailing window. (These rows are the ones
+    # that precede the first row within the updated window.)
+    rows_to_delete = 0
+    if (len(keys) > 0) and (keys[0] in previous_keys):
+        rows_to_delete = previous_keys.index(keys[0])
+    previous_hashes = previous_hashes[rows_to_delete:]
+
+    # Comparing the remaining rows to the updated window position by
+    # position in order to find rows that are new or have changed:
+    changed_positions = [
+        i for i in range(len(rows))
+        if (i >= len(previous_hashes)) or (
+            previous_hashes[i] != row_hashes[i])]
+
+    requests = []
+    if rows_to_delete > 0:
+        requests.append({'deleteDimension':{'range':{
+            'sheetId':sheet_id, 'dimension':'ROWS',
+            'startIndex':1, 'endIndex':1 + rows_to_delete}}})
+    # Resizing the worksheet so that it has exactly enough room for the
+    # header and data rows. (This also removes any rows at the bottom
+    # of the worksheet that are no longer needed.)
+    requests.append({'updateSheetProperties':{
+        'properties':{'sheetId':sheet_id, 'gridProperties':{
+            'rowCount':len(rows) + 1, 'columnCount':len(header)}},
+        'fields':'gridProperties(rowCount,columnCount)'}})
+    if rewrite_header == True:
+        requests.append(create_update_request(sheet_id, 0, [header]))
+    # Grouping consecutive changed rows into a single request:
+    run_start = 0
+    while run_start < len(changed_positions):
+        run_end = run_start
+        while ((run_end + 1 < len(changed_positions)) and
+               (changed_positions[run_end + 1] ==
+                changed_positions[run_end] + 1)):
+            run_end += 1
+        first_position = changed_positions[run_start]
+        last_position = changed_positions[run_end]
+        requests.append(create_update_request(
+            sheet_id, first_position + 1,
+            rows[first_position:last_position + 1], 
+            date_time_positions))
+        run_start = run_end + 1
+
+    updated_manifest = {
+        'header':header, 'keys':keys, 'row_hashes':row_hashes}
+    sync_summary = {'deleted_rows':rows_to_delete,
+                    'uploaded_rows':len(changed_positions)}
+    return requests, updated_manifest, sync_summary
+
+
+def sync_dataframe_to_worksheet(ws, df, manifest_path,
+                                key_columns = ['Date', 'Time'],
+                                max_rows = 960, full_sync = False):
+    '''This function updates the worksheet ws so that it contains the
+    last max_rows rows of df (along with a header row), uploading only
+    the rows that have changed since the previous sync.
+
+    manifest_path: the path to the .json file that stores the key and
+    hash of each row currently present within ws. (It will get created
+    during the first sync.) Each worksheet should have its own
+    manifest.
+
+    See create_sync_requests() for an explanation of the other
+    arguments. The function returns a dictionary showing how many rows
+    were deleted from the top of the worksheet and how many were 
+    uploaded.'''
+    requests, updated_manifest, sync_summary = create_sync_requests(
+        ws.id, df, load_manifest(manifest_path), 
+        key_columns = key_columns, max_rows = max_rows, 
+        full_sync = full_sync)
+
+    ws.spreadsheet.batch_update({'requests':requests})
+
+    # Saving the manifest only after the update succeeded:
+    save_manifest(manifest_path, updated_manifest)
+
+    print(f"Deleted {sync_summary['deleted_rows']} rows from and \
+uploaded {sync_summary['uploaded_rows']} rows to the {ws.title} \
+worksheet.")
+    return sync_summary
+
+
+def sync_dataframes_to_workbook(wb, df_dict, manifest_folder,
+                                key_columns = ['Date', 'Time'],
+                                max_rows = 960, full_sync = False):
+    '''This function updates multiple worksheets within the workbook 
+    wb at once. All of the worksheets' updates are combined into a 
+    single batch_update() call, so only one request needs to be sent
+    to Google Sheets regardless of how many worksheets are being 
+    updated. (One additional call is made to look up each worksheet's
+    ID.)
+
+    df_dict: a dictionary whose keys are worksheet names and whose 
+    values are the DataFrames that should be copied to those 
+    worksheets.
+
+    manifest_folder: the folder in which each worksheet's manifest will
+    be stored. (Manifests will be named {worksheet}_sheet_manifest.json
+    .)
+
+    See create_sync_requests() for an explanation of the other
+    arguments. The function returns a dictionary showing the number of
+    bytes sent to Google Sheets; the number of cells written; and the 
+    rows deleted and uploaded for each worksheet.'''
+    sheet_ids = {ws.title:ws.id for ws in wb.worksheets()}
+    all_requests = []
+    updated_manifests = {}
+    worksheet_summaries = {}
+    for title, df in df_dict.items():
+        requests, updated_manifests[title], worksheet_summaries[title] = (
+            create_sync_requests(
+                sheet_ids[title], df, load_manifest(os.path.join(
+                    manifest_folder, f'{title}_sheet_manifest.json')),
+                key_columns = key_columns, max_rows = max_rows,
+                full_sync = full_sync))
+        all_requests.extend(requests)
+
+    body = {'requests':all_requests}
+    wb.batch_update(body)
+
+    for title, updated_manifest in updated_manifests.items():
+        save_manifest(os.path.join(
+            manifest_folder, f'{title}_sheet_manifest.json'), 
+            updated_manifest)
+
+    upload_summary = {
+        'bytes_written':len(json.dumps(body).encode('utf-8')),
+        'cells_written':sum(
+            len(row['values']) for request in all_requests 
+            if 'updateCells' in request 
+            for row in request['updateCells']['rows']),
+        'worksheets':worksheet_summaries}
+    for title, sync_summary in worksheet_summaries.items():
+        print(f"{title}: deleted {sync_summary['deleted_rows']} rows \
+and uploaded {sync_summary['uploaded_rows']} rows.")
+    print(f"Wrote {upload_summary['cells_written']} cells \
+({upload_summary['bytes_written']} bytes) to Google Sheets.")
+    return upload_summary
+
+
+def verify_worksheets(wb, manifest_folder, titles):
+    '''This function reads the worksheets whose names are listed within
+    titles back into DataFrames, then checks whether each worksheet's
+    rows match the hashes stored within its manifest. All worksheets 
+    are read via a single values_batch_get() call.
+
+    The function returns a dictionary of DataFrames (one for each
+    worksheet) along with a dictionary showing the number of rows 
+    within each worksheet that didn't match its manifest. (If no
+    manifest exists for a worksheet, all of its rows will be counted
+    as mismatches.)'''
+    # A range consisting of only a worksheet name will retrieve all 
+    # of that worksheet's values. UNFORMATTED_VALUE allows numbers to 
+    # be returned as numbers rather than as formatted strings.
+    response = wb.values_batch_get(
+        [f"'{title}'" for title in titles],
+        params = {'valueRenderOption':'UNFORMATTED_VALUE'})
+    
+    df_dict = {}
+    mismatch_dict = {}
+    for title, value_range in zip(titles, response['valueRanges']):
+        values = value_range.get('values', [])
+        if len(values) == 0:
+            df_dict[title] = pd.DataFrame()
+            mismatch_dict[title] = 0
+            continue
+        header = values[0]
+        # Google Sheets leaves out empty cells at the end of each row
+        # and returns other empty cells as empty strings, so these 
+        # rows need to be standardized before they can be compared 
+        # with the manifest.
+        rows = [[None if value == '' else value for value in row] 
+                + [None] * (len(header) - len(row))
+                for row in values[1:]]
+        df_dict[title] = pd.DataFrame(rows, columns = header)
+
+        manifest = load_manifest(os.path.join(
+            manifest_folder, f'{title}_sheet_manifest.json'))
+        if manifest is None:
+            mismatch_dict[title] = len(rows)
+            continue
+        expected_hashes = manifest['row_hashes']
+        row_hashes = [hash_row(row) for row in rows]
+        mismatch_dict[title] = sum(
+            row_hash != expected_hash for row_hash, expected_hash in 
+            zip(row_hashes, expected_hashes)) + abs(
+                len(row_hashes) - len(expected_hashes))
+        if mismatch_dict[title] > 0:
+            print(f"Warning: {mismatch_dict[title]} rows within the \
+{title} worksheet don't match its manifest. Consider running a full \
+sync.")
+    return df_dict, mismatch_dict
+
+
+class LocalSpreadsheet:
+    '''This class stores worksheets in memory and supports the 
+    worksheets(), batch_update(), and values_batch_get() methods used
+    above (along with the subset of batch_update requests that 
+    create_sync_requests() creates). It can be passed to 
+    sync_dataframes_to_workbook() and verify_worksheets() in place of
+    a gspread Spreadsheet object for testing purposes.
+
+    titles: the names of the worksheets that the spreadsheet should
+    contain.'''
+
+    def __init__(self, titles):
+        # Each worksheet's cells are stored as a list of rows.
+        self.sheets = {}
+        for sheet_id, title in enumerate(titles):
+            self.sheets[sheet_id] = LocalWorksheet(
+                self, sheet_id, title)
+        self.call_count = 0
+
+    def worksheets(self):
+        return list(self.sheets.values())
+
+    def worksheet(self, title):
+        return [ws for ws in self.sheets.values() if ws.title == title][0]
+
+    def batch_update(self, body):
+        self.call_count += 1
+        for request in body['requests']:
+            if 'deleteDimension' in request:
+                cell_range = request['deleteDimension']['range']
+                del self.sheets[cell_range['sheetId']].cells[
+                    cell_range['startIndex']:cell_range['endIndex']]
+            elif 'updateSheetProperties' in request:
+                properties = request['updateSheetProperties'][
+                    'properties']
+                ws = self.sheets[properties['sheetId']]
+                row_count = properties['gridProperties']['rowCount']
+                column_count = properties['gridProperties'][
+                    'columnCount']
+                ws.cells = [
+                    (row + [None] * column_count)[:column_count] 
+                    for row in ws.cells[:row_count]]
+                ws.cells += [[None] * column_count] * (
+                    row_count - len(ws.cells))
+            elif 'updateCells' in request:
+                start = request['updateCells']['start']
+                ws = self.sheets[start['sheetId']]
+                for row_offset, row in enumerate(
+                    request['updateCells']['rows']):
+                    row_index = start['rowIndex'] + row_offset
+                    ws.cells[row_index] = list(ws.cells[row_index])
+                    for column_offset, cell_data in enumerate(
+                        row['values']):
+                        if len(cell_data) == 0:
+                            value = None
+                        else:
+                            value = list(cell_data[
+                                'userEnteredValue'].values())[0]
+                            if 'userEnteredFormat' in cell_data:
+                                value = LocalDateTime(value)
+                        ws.cells[row_index][
+                            start['columnIndex'] + column_offset] = value
+            else:
+                raise ValueError(f"Unsupported request: {request}")
+        return {}
+
+    def values_batch_get(self, ranges, params = None):
+        self.call_count += 1
+        value_ranges = []
+        for cell_range in ranges:
+            ws = self.worksheet(cell_range.strip("'"))
+            # Mimicking the Google Sheets API's handling of empty cells
+            # (see verify_worksheets()):
+            values = []
+            for row in ws.cells:
+                row = ['' if value is None else 
+                       render_local_value(value, params) 
+                       for value in row]
+                while (len(row) > 0) and (row[-1] == ''):
+                    row.pop()
+                values.append(row)
+            while (len(values) > 0) and (len(values[-1]) == 0):
+                values.pop()
+            value_ranges.append({'range':cell_range, 'values':values})
+        return {'valueRanges':value_ranges}
+
+
+class LocalDateTime(float):
+    '''A serial number stored within a LocalSpreadsheet cell that has
+    been formatted as a date and time.'''
+    pass
+
+
+def render_local_value(value, params):
+    '''Mimics the way in which the Google Sheets API returns values
+    for the valueRenderOption and dateTimeRenderOption settings in 
+    params. (Dates and times are returned as serial numbers unless
+    dateTimeRenderOption is 'FORMATTED_STRING'.)'''
+    if isinstance(value, LocalDateTime):
+        if (params or {}).get('dateTimeRenderOption') == (
+            'FORMATTED_STRING'):
+            return str((serial_number_epoch + pd.Timedelta(
+                days = float(value))).round('s'))
+        value = float(value)
+        if value.is_integer():
+            return int(value)
+    return value
+
+
+class LocalWorksheet:
+    '''A worksheet stored within a LocalSpreadsheet.'''
+
+    def __init__(self, spreadsheet, sheet_id, title):
+        self.spreadsheet = spreadsheet
+        self.id = sheet_id
+        self.title = title
+        self.cells = []
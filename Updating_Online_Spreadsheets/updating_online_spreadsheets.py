@@ -3,7 +3,7 @@
 
 # # Updating Online Spreadsheets
 # 
-# This script will demonstrate how to upload the contents of a DataFrame into a Google Sheets file using Python's `gspread` and `gspread-dataframe` libraries. This is a convenient option for sharing your output with others, especially if you need to update that output on a regular basis.
+# This script will demonstrate how to upload the contents of a DataFrame into a Google Sheets file using Python's `gspread` library. This is a convenient option for sharing your output with others, especially if you need to update that output on a regular basis.
 # 
 # The Google Sheets worksheet that this script will update can be found at https://docs.google.com/spreadsheets/d/17aDJ3mg49-n0IEnDgN7ZB85pO87fiUpkZPULYDB8dmo/edit?usp=sharing .
 # 
@@ -28,19 +28,22 @@ display_type = config_notebook(display_max_columns = 5)
 display_cols = ['Station', 'Date/Time', 'Temp', 
                 '1-Hour Precip', 'Rolling 24-Hour Precip']
 
-with open('service_key_path.txt') as file:
-    service_key_path = file.read()
+# Specifying where the weather data should be published: (Set this
+# variable to 'parquet', 'sqlite', or 'memory' to publish the data 
+# locally instead--e.g. when testing this script without a Google 
+# Cloud service account. See data_store.py within the 
+# Simple_App_Without_Login folder for more details.)
+publish_store_type = 'google_sheets'
+
+if publish_store_type == 'google_sheets':
+    with open('service_key_path.txt') as file:
+        service_key_path = file.read()
 
 
 # In[2]:
 
 
 import gspread
-from gspread_dataframe import set_with_dataframe, get_as_dataframe
-# From https://pypi.org/project/gspread-dataframe/
-# gspread_dataframe isn't available within conda-forge as of 2025-02-20;
-# therefore, you'll need to install it via the following pip command:
-# pip install gspread-dataframe
 
 
 # (If you're using gspread's default path, you can comment out the first line and then uncomment the following one.)
@@ -48,9 +51,10 @@ from gspread_dataframe import set_with_dataframe, get_as_dataframe
 # In[3]:
 
 
-gc = gspread.service_account(filename=service_key_path)
+if publish_store_type == 'google_sheets':
+    gc = gspread.service_account(filename=service_key_path)
 
-# gc = gspread.service_account()
+    # gc = gspread.service_account()
 
 # (This code comes from
 # # From https://docs.gspread.org/en/latest/index.html)
@@ -64,12 +68,20 @@ gc = gspread.service_account(filename=service_key_path)
 
 
 import pandas as pd
-from weather_import import weather_import
+from weather_import import weather_import_batch
+from sheets_sync import verify_worksheets
+# The stores to which this data can be published are defined within the
+# same folder as the Dash app that displays this data:
+sys.path.insert(1, '../Online_Visualizations/Simple_App_Without_Login')
+from data_store import (GoogleSheetsStore, ParquetStore, SQLiteStore, 
+                        MemoryStore)
 
 
 # ## Importing weather data
 # 
-# The following cells will import weather data for three Virginia weather stations; combine it with pre-existing data; and then save a revised copy of this table to a .csv file.
+# The following cell will import weather data for three Virginia weather stations; combine it with pre-existing data; and then return each station's most recent data (including rolling precipitation totals and other derived fields) within a dictionary of DataFrames. `weather_import_batch()` downloads data for multiple stations at once, so this list could be expanded to include many more stations without greatly increasing the script's runtime. (Note that KOKV data appears to be recorded at 20-minute intervals rather than hourly ones.)
+# 
+# Since only the most recent 960 rows will get uploaded to Google Sheets, only the last 3 months of data need to be returned.
 
 # In[5]:
 
@@ -77,83 +89,35 @@ from weather_import import weather_import
 data_folder = 'weather_data'
 
 
-# ### Importing weather data for Charlottesville
-
 # In[6]:
 
 
-print("Downloading KCHO data.")
-
-
-# In[7]:
-
-
-weather_import(
-    station_code = 'KCHO',
-    data_folder = data_folder)
-
-
-# ### Importing weather data for Dulles International Airport
-
-# In[8]:
-
-
-print("Downloading KIAD data.")
-
-
-# In[9]:
-
-
-weather_import(
-    station_code = 'KIAD',
-    data_folder = data_folder)
-
-
-# ### Importing weather data for Winchester
-# 
-# (This data appears to be recorded at 20-minute intervals rather than hourly ones.)
-
-# In[10]:
-
-
-print("Downloading KOKV data.")
-
-
-# In[11]:
-
-
-test_df = weather_import(
-    station_code = 'KOKV',
-    data_folder = data_folder)
-test_df
+weather_data_dict = weather_import_batch(
+    station_list = ['KCHO', 'KIAD', 'KOKV'],
+    data_folder = data_folder,
+    months_to_load = 3)
 
 
 # ## Reading these datasets into DataFrames
 
-# In[12]:
+# In[7]:
 
 
-df_weather_kcho = pd.read_csv(
-    data_folder+'/'+'KCHO'+'_'
-    +'historical_hourly_data_updated.csv')
+df_weather_kcho = weather_data_dict['KCHO']
 df_weather_kcho[display_cols].tail()
 
 
-# In[13]:
+# In[8]:
 
 
-df_weather_kiad = pd.read_csv(
-    data_folder+'/'+'KIAD'+'_'
-    +'historical_hourly_data_updated.csv')
+df_weather_kiad = weather_data_dict['KIAD']
 df_weather_kiad[display_cols].tail()
 
 
-# In[14]:
+# In[9]:
 
 
-df_weather_kokv = pd.read_csv(
-    data_folder+'/'+'KOKV'+'_'
-    +'historical_hourly_data_updated.csv')
+df_weather_kokv = weather_data_dict['KOKV']
 df_weather_kokv[display_cols].tail()
 
 
@@ -166,64 +130,57 @@ df_weather_kokv[display_cols].tail()
 # In[15]:
 
 
-wb = gc.open_by_key('17aDJ3mg49-n0IEnDgN7ZB85pO87fiUpkZPULYDB8dmo')
-# Based on 
-# https://docs.gspread.org/en/latest/user-guide.html#opening-a-spreadsheet
-wb
+if publish_store_type == 'google_sheets':
+    wb = gc.open_by_key('17aDJ3mg49-n0IEnDgN7ZB85pO87fiUpkZPULYDB8dmo')
+    # Based on 
+    # https://docs.gspread.org/en/latest/user-guide.html#opening-a-spreadsheet
+    wb
 
 
-# Next, I'll select the 'KCHO' worksheet within this workbook, as that's the first one I'd like to update. I'll also clear out the current contents using `ws.clear()`; that way, only the latest DataFrame contents will appear within the spreadsheet after I call `set_with_dataframe` below. (If the most recent DataFrame is smaller than the previous version, parts of the previous one would still appear unless `ws.clear()` is called.
+# Next, I'll create a `GoogleSheetsStore` object (defined within data_store.py) for this workbook, then call its `write_tables()` method to export each station's DataFrame to the worksheet with the same name. (The other store types offer the same `write_tables()` method, so the rest of this script doesn't need to change when publishing data locally.)
+# 
+# Earlier versions of this script cleared out each worksheet with `ws.clear()`, then uploaded the entire DataFrame via `set_with_dataframe()`. However, only a few rows change from one hour to the next, so this approach sent far more data to Google Sheets than necessary. (In addition, the Dash app that reads from this workbook could have encountered an empty worksheet if it happened to import data between these two calls.) 
+# 
+# `write_tables()` instead calls `sync_dataframes_to_workbook()` (defined within sheets_sync.py), which stores a hash of each row within a 'manifest' file for each worksheet, then uses these manifests to upload only new and changed rows. Rows that are no longer among the most recent 960 get deleted from the top of each worksheet. The changes for all three worksheets get applied at once via a single `batch_update()` call, and the function reports how many cells (and bytes) were sent to Google Sheets.
 
 # In[16]:
 
 
-ws = wb.worksheet('KCHO')
-# https://docs.gspread.org/en/latest/user-guide.html#opening-a-spreadsheet
-
-
-# In[17]:
-
-
-ws.clear() 
-ws
-
-
-# Finally, I'll call `set_with_dataframe` to export this DataFrame to df_weather.
-
-# In[18]:
-
-
 # Only the most recent 960 rows (representing 40 days' worth of data if
 # no entries were missing) will get exported to Google Sheets. This will
 # limit the time (and potentially money) needed to import this data
 # into a Dash app (https://github.com/kburchfiel/pfn/tree/
 # main/Online_Visualizations/Simple_App_Without_Login)
 # that utilizes it.
-set_with_dataframe(ws, df_weather_kcho.iloc[-960:])
-# Source: https://pypi.org/project/gspread-dataframe/
+if publish_store_type == 'google_sheets':
+    data_store = GoogleSheetsStore(
+        wb, manifest_folder = data_folder, max_rows = 960)
+elif publish_store_type == 'parquet':
+    data_store = ParquetStore(data_folder+'/published', max_rows = 960)
+elif publish_store_type == 'sqlite':
+    data_store = SQLiteStore(data_folder+'/published_weather_data.db', 
+                             max_rows = 960)
+else:
+    data_store = MemoryStore(max_rows = 960)
 
+upload_summary = data_store.write_tables(
+    {'KCHO':df_weather_kcho, 'KIAD':df_weather_kiad, 
+     'KOKV':df_weather_kokv})
 
-# In order to confirm that this upload was successful, we can call `get_as_dataframe` to import the contents of the worksheet into a new DataFrame:
 
-# In[19]:
-
-
-df_weather_from_ws = get_as_dataframe(ws)
-df_weather_from_ws[display_cols].tail()
-
-
-# ### Performing the same data export steps for KIAD and KOKV data
-
-# In[20]:
+# In order to confirm that this upload was successful, we can import the contents of all three tables into new DataFrames. (For Google Sheets, `verify_worksheets()` does so via a single API call, then compares each worksheet's rows to its manifest.)
 
+# In[17]:
 
-ws = wb.worksheet('KIAD')
-ws.clear() 
-set_with_dataframe(ws, df_weather_kiad.iloc[-960:])
 
-ws = wb.worksheet('KOKV')
-ws.clear() 
-set_with_dataframe(ws, df_weather_kokv.iloc[-960:])
+if publish_store_type == 'google_sheets':
+    published_df_dict, mismatch_dict = verify_worksheets(
+        wb, manifest_folder = data_folder, 
+        titles = ['KCHO', 'KIAD', 'KOKV'])
+    print(mismatch_dict)
+else:
+    published_df_dict = data_store.read_tables(['KCHO', 'KIAD', 'KOKV'])
+published_df_dict['KCHO'][display_cols].tail()
 
 
 # ## Appendix: A shell script and crontab entry for running this notebook automatically
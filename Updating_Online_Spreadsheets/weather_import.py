@@ -4,17 +4,82 @@
 
 import pandas as pd
 import os
+import io
+import re
+import json
+import hashlib
 import numpy as np
+import requests
+import pyarrow as pa
+import pyarrow.parquet as pq
+from html.parser import HTMLParser
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def weather_import(station_code, data_folder = ''):
+# The data type of each column within the derived weather dataset.
+# apply_weather_schema() converts every monthly file to these same 
+# types before it gets saved. (If each file's types were instead 
+# inferred from its contents, a month without any 'Weather' values 
+# would store that column as floats, and a month whose visibility 
+# readings included '1/4' would store 'Vis. (mi.)' as text; 
+# load_weather_data() wouldn't be able to combine these files with
+# the others.)
+# Readings are stored as float32 values, which offer more than enough
+# precision for NWS data while taking up half as much space; station
+# codes, sky conditions, and other repetitive text values are stored 
+# as categories; and columns that can contain both numbers and text
+# are stored as strings. Any column not listed here will also be 
+# stored as strings.
+DERIVED_COLUMN_TYPES = {
+    'Date':'string', 'Day':'int8', 'Date/Time':'datetime', 
+    'Timestamp (UTC)':'datetime_utc', 'Time':'string', 
+    'Time Zone':'category', 'Wind (mph)':'category', 
+    'Vis. (mi.)':'string', 'Weather':'category', 'Sky Cond.':'category',
+    'Temp':'float32', 'Dew Point':'float32', 
+    'Relative Humidity':'float32', 'Wind Chill (Â°F)':'float32', 
+    'Heat Index (Â°F)':'float32', 'Altimeter (in.)':'float32', 
+    'sea level (mb)':'float32', '1-Hour Precip':'float32', 
+    '3-Hour Precip':'float32', '6-Hour Precip':'float32', 
+    'Data Retrieval Date':'datetime', 'Obs_Month':'int8', 
+    'Obs_Year':'int16', 'Hour':'int8', 'Station':'category', 
+    'Rolling 3-Hour Precip':'float32', 'Rolling 6-Hour Precip':'float32',
+    'Rolling 12-Hour Precip':'float32', 
+    'Rolling 24-Hour Precip':'float32', 'Windspeed':'float32'}
+# The Parquet (Arrow) equivalents of these types:
+ARROW_TYPES = {'string':pa.string(), 'float32':pa.float32(),
+               'int8':pa.int8(), 'int16':pa.int16(), 
+               'datetime':pa.timestamp('ns'), 
+               'datetime_utc':pa.timestamp('ns', tz = 'UTC'),
+               'category':pa.dictionary(pa.int32(), pa.string())}
+# The UTC offsets (in hours) of time zone abbreviations that may appear
+# within NWS observation pages:
+TIME_ZONE_OFFSETS = {'EST':-5, 'EDT':-4, 'CST':-6, 'CDT':-5, 'MST':-7,
+                     'MDT':-6, 'PST':-8, 'PDT':-7, 'AKST':-9, 'AKDT':-8,
+                     'HST':-10}
+
+def weather_import(station_code, data_folder = '', export_csv = False,
+                   session = None):
     '''This function retrieves National Weather Service (NWS) hourly 
     weather data for the last 
     3 days for the station specified in station_code; adds it to
     pre-existing data (if any); and then saves this data to
     the folder specified in data_folder. 
     (Specifying a data folder is optional; if none is specified, files
-    will simply be saved to the current working directory.)'''
+    will simply be saved to the current working directory.)
+
+    The full historical dataset (including rolling precipitation totals
+    and other derived fields) can be retrieved via load_weather_data().
+    Set export_csv to True to also save a copy of this dataset to
+    {station_code}_historical_hourly_data_updated.csv.
+
+    If the station's NWS page hasn't changed since the last time this
+    function ran, no further steps will take place (and no files will
+    be updated). This allows the function to be run frequently 
+    (e.g. every 5 minutes) without much of a performance cost.
+
+    session: an optional requests.Session object that will be used to
+    download the NWS page. (Passing a session allows connections to be
+    reused when importing data for multiple stations.)'''
     if len(data_folder) > 0:
         post_folder_char = '/'
     else:
@@ -24,21 +89,21 @@ def weather_import(station_code, data_folder = ''):
     # 3-day weather data is being retrieved. Note that this date won't
     # match the dates for earlier records within this dataset.
     
+    history_folder = create_history_folder(station_code, data_folder)
+
     # Importing the latest set of hourly observations from the 
-    # National Weather Service:
-
-    # read_html returns a list of tables (even though only one table is 
-    # currently present on this site), so we'll use [0] to access that
-    # table.
-    # The final 3 rows are simply a repetition of the header, so I added in
-    # [:-3] to exclude them from the DataFrame.
-    # header = 2 specifies that the third row in the DataFrame should be 
-    # used as a header. (The first two rows' values are mostly duplicates
-    # of this row's data.)
+    # National Weather Service: (If the page hasn't changed since the 
+    # last import, page_text will be None, and the function can stop
+    # here.)
+
+    page_text, fetch_state = fetch_observation_page(
+        station_code, history_folder, session = session)
+    if page_text is None:
+        print(f"{station_code}'s observation page hasn't changed since \
+the last import, so no new data will be added.")
+        return
     
-    df_3day_data = pd.read_html(
-    f'https://forecast.weather.gov/data/obhistory/{station_code}.html',
-    header = 2)[0][:-3]
+    df_3day_data = read_observation_table(page_text)
     df_3day_data.tail()
 
     # The observation time column within this dataset shows the time zone; 
@@ -132,79 +197,563 @@ def weather_import(station_code, data_folder = ''):
 _most_recent_3_day_data.csv', 
         index = False)
 
-    # Next, the function will append new data within this file to 
-    # a historical dataset. If such a dataset doesn't exist already,
-    # it will get created shortly.
-    # Determining which argument to pass to os.listdir(): (This argument
-    # should be None if no data_folder value was provided so as not 
-    # to raise an error.)
-    
-    if len(data_folder) > 0:
-        listdir_arg = data_folder
-    else:
-        listdir_arg = None
-    if f'{station_code}_historical_hourly_data.csv' not in os.listdir(
-        listdir_arg):
-        
-        print("Historical copy of this dataset doesn't yet exist. \
-Initializing it as a copy of the 3-day dataset.")
-        df_3day_data.to_csv(
-            f'{data_folder}{post_folder_char}{station_code}\
-_historical_hourly_data.csv', index = False)
-              
-    # Reading in historical weather data:
-    
-    df_historical_data = pd.read_csv(
-        f'{data_folder}{post_folder_char}\
-{station_code}_historical_hourly_data.csv')   
-    print("Original length of historical data file:",
-          len(df_historical_data))
-    
     # Recreating df_3day_data by importing the .csv copy of the table 
     # that the function just created:
     
     # (This step may appear unnecessary, but it does help ensure that 
-    #  both this data and that found in df_historical_data will use 
-    #  the same data types.)
+    #  this data will use the same data types as the data that was
+    #  previously added to the historical dataset.)
 
     df_3day_data = pd.read_csv(f'{data_folder}{post_folder_char}\
 {station_code}_most_recent_3_day_data.csv')
 
-    # Combining historical data with the latest 3-day dataset:
-    
-    df_wx = pd.concat([df_historical_data, df_3day_data])
     # Storing the station code within the DataFrame:
-    df_wx['Station'] = station_code
-    
-    # The function will now remove duplicate Date/Time entries.
+    df_3day_data['Station'] = station_code
     
     # Calculating the 24-digit hour corresponding to each DataFrame:
     # (This code assumes that a 24-hour clock is being used to display
     # times.)
-    df_wx['Hour'] = df_wx['Time'].str.split(
+    df_3day_data['Hour'] = df_3day_data['Time'].str.split(
         ':').str[0].astype('int')
 
-    # Keeping only one result per date and hour:
-    # (This approach will prove useful when using .rolling() to calculate
-    # rainfall totals for specific periods, as it will allow us to
-    # assume that N rows of data represent N hours. However, 
-    # at least one NWS station (KOKV) reports recent weather data
-    # every 20 minutes; only one in three of such reports will get
-    # retained after drop_duplicates() gets called. 
-    df_wx.drop_duplicates(
-        ['Date', 'Hour'], keep = 'last', inplace = True)
-    # This isn't a perfect approach, as it will likely cause an 
-    # hour of data to get lost when Daylight Savings Time ends.
-     
-    print("New length of historical data file:",
-          len(df_wx))
-
-    # Saving this updated copy of df_wx to a .csv file:
-    df_wx.to_csv(
-        f'{data_folder}{post_folder_char}\
-{station_code}_historical_hourly_data.csv', index = False)
-
-    ## Making further updates to this combined dataset:
+    # Next, the function will add this new data to a historical dataset.
+    # This dataset is stored as a set of monthly Parquet files (e.g.
+    # KCHO_history/raw/2025-03.parquet) rather than as a single .csv
+    # file. Since the latest 3 days of data will only ever fall within 
+    # one or two months, only one or two of these files will need to be
+    # updated each time the function runs, regardless of how large the 
+    # full historical dataset becomes.
+
+    raw_folder = os.path.join(history_folder, 'raw')
+
+    # If this station's historical data is still stored within a 
+    # .csv file from an earlier version of this function, it will 
+    # first get copied into the monthly files. (This step only needs 
+    # to take place once.)
+    historical_csv_path = f'{data_folder}{post_folder_char}\
+{station_code}_historical_hourly_data.csv'
+    if (len(list_partitions(raw_folder)) == 0) and (
+        os.path.exists(historical_csv_path)):
+        print("Copying historical .csv data into monthly Parquet files.")
+        df_historical_data = pd.read_csv(historical_csv_path)
+        df_historical_data['Station'] = station_code
+        df_historical_data['Hour'] = df_historical_data[
+            'Time'].str.split(':').str[0].astype('int')
+        upsert_partitions(df_historical_data, raw_folder)
+    
+    # Adding the latest data to the historical dataset:
+    # (upsert_partitions() keeps only one result per date and hour; see
+    # that function for more details.)
+    new_row_count = upsert_partitions(df_3day_data, raw_folder)
+    print(f"Added or updated {new_row_count} rows within \
+{station_code}'s historical dataset.")
+
+    # Updating the derived copy of this dataset (which stores rolling
+    # precipitation totals and other calculated fields). Only the new
+    # rows, along with the 24 rows that precede them, need to be
+    # processed here, so this step will take the same amount of time
+    # regardless of how many years of data have been collected.
+    update_derived_partitions(station_code, data_folder, df_3day_data)
+
+    # Now that this page's data has been stored, its ETag, 
+    # Last-Modified, and hash values can be saved for use in the next
+    # import. (Saving these values at the end of the function ensures 
+    # that, if an error occurs above, the same page will get processed
+    # again next time.)
+    save_fetch_state(history_folder, fetch_state)
+
+    # Creating an updated .csv copy of the full dataset (if requested):
+    # (This step requires the entire history to be read and processed,
+    # so it's best to skip it unless this .csv file is actually needed.)
+    if export_csv == True:
+        df_wx = load_weather_data(station_code, data_folder)
+        df_wx.to_csv(f'{data_folder}{post_folder_char}\
+{station_code}_historical_hourly_data_updated.csv', index = False)
+
+
+def fetch_observation_page(station_code, history_folder, session = None,
+                           timeout = 30):
+    '''This function downloads the NWS observation history page for 
+    station_code. It returns a tuple containing the page's text and a
+    dictionary of values (its ETag, Last-Modified date, and a hash of 
+    its observation table) that can be passed to save_fetch_state().
+
+    In order to avoid unnecessary work, the function sends the ETag 
+    and Last-Modified values from the previous import along with its 
+    request. If the server indicates that the page hasn't changed 
+    since then (via a 304 response), or if the page's observation 
+    table is identical to the one processed last time, the page text
+    will be returned as None.'''
+    previous_state = load_fetch_state(history_folder)
+    request_headers = {}
+    if previous_state.get('etag') is not None:
+        request_headers['If-None-Match'] = previous_state['etag']
+    if previous_state.get('last_modified') is not None:
+        request_headers['If-Modified-Since'] = previous_state[
+            'last_modified']
+    if session is None:
+        session = requests
+    response = session.get(
+        f'https://forecast.weather.gov/data/obhistory/{station_code}.html',
+        headers = request_headers, timeout = timeout)
+    if response.status_code == 304:
+        return None, previous_state
+    response.raise_for_status()
+
+    # Decoding the page as Latin-1 text, which matches the way 
+    # pd.read_html() (used within earlier versions of this function)
+    # read it in. This keeps column names like 'Wind Chill (Â°F)' 
+    # consistent with those in the historical data.
+    page_text = response.content.decode('latin-1')
+
+    # Hashing only the observation table (rather than the full page) 
+    # so that changes elsewhere on the page won't cause the same 
+    # observations to get processed again:
+    table_text = page_text[page_text.find('<table'):page_text.rfind(
+        '</table>')]
+    fetch_state = {
+        'etag':response.headers.get('ETag'),
+        'last_modified':response.headers.get('Last-Modified'),
+        'content_hash':hashlib.sha256(
+            table_text.encode('latin-1')).hexdigest()}
+    if fetch_state['content_hash'] == previous_state.get('content_hash'):
+        # The table hasn't changed, so its new ETag and Last-Modified
+        # values can be saved right away.
+        save_fetch_state(history_folder, fetch_state)
+        return None, fetch_state
+    return page_text, fetch_state
+
+
+def load_fetch_state(history_folder):
+    '''Returns the dictionary saved by save_fetch_state() (or an empty
+    dictionary if no such file exists yet).'''
+    state_path = os.path.join(history_folder, 'fetch_state.json')
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path) as file:
+        return json.load(file)
+
+
+def save_fetch_state(history_folder, fetch_state):
+    '''Saves fetch_state (see fetch_observation_page()) to the 
+    station's history folder.'''
+    state_path = os.path.join(history_folder, 'fetch_state.json')
+    with open(state_path + '.tmp', 'w') as file:
+        json.dump(fetch_state, file)
+    os.replace(state_path + '.tmp', state_path)
+
+
+class ObservationTableParser(HTMLParser):
+    '''This class collects the text, rowspan, and colspan values of 
+    each cell within the first table of an HTML page. (Tables nested
+    inside that table are ignored.) Python's built-in HTML parser is
+    used, so lxml and BeautifulSoup aren't needed.'''
+
+    def __init__(self):
+        super().__init__(convert_charrefs = True)
+        self.rows = []
+        self.table_depth = 0
+        self.table_finished = False
+        self.current_cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.table_finished == True:
+            return
+        if tag == 'table':
+            self.table_depth += 1
+        elif self.table_depth == 1:
+            if tag == 'tr':
+                self.rows.append([])
+                self.current_cell = None
+            elif (tag in ['td', 'th']) and (len(self.rows) > 0):
+                attrs = dict(attrs)
+                # Each cell is stored as a [text_fragments, rowspan, 
+                # colspan] list:
+                self.current_cell = [[], int(attrs.get('rowspan') or 1), 
+                                     int(attrs.get('colspan') or 1)]
+                self.rows[-1].append(self.current_cell)
+
+    def handle_endtag(self, tag):
+        if self.table_finished == True:
+            return
+        if tag == 'table':
+            self.table_depth -= 1
+            if self.table_depth == 0:
+                self.table_finished = True
+        elif (tag in ['td', 'th']) and (self.table_depth == 1):
+            self.current_cell = None
+
+    def handle_data(self, data):
+        if (self.current_cell is not None) and (self.table_depth == 1):
+            self.current_cell[0].append(data)
+
+
+def extract_observation_table(page_text):
+    '''This function converts the first table within page_text into a
+    DataFrame, producing the same output as 
+    pd.read_html(page_text, header = 2)[0][:-3] for NWS observation 
+    history pages. (The third row of the table is used as the header,
+    since the first two rows' values are mostly duplicates of this 
+    row's data; the final 3 rows, which simply repeat the header, are
+    excluded.) All values are returned as strings.
+
+    A ValueError will be raised if the table doesn't have the expected
+    layout.'''
+    parser = ObservationTableParser()
+    parser.feed(page_text)
+    parser.close()
+
+    # Copying cells that span multiple rows or columns into each of 
+    # those rows and columns (as pd.read_html() does). The grid
+    # dictionary maps (row, column) positions to cell text.
+    grid = {}
+    for row_index, row in enumerate(parser.rows):
+        column_index = 0
+        for text_fragments, rowspan, colspan in row:
+            # Skipping over positions already filled by cells from 
+            # earlier rows:
+            while (row_index, column_index) in grid:
+                column_index += 1
+            # Collapsing line breaks and repeated whitespace in the same
+            # way that pd.read_html() does:
+            text = re.sub(r'[\r\n]+|\s{2,}', ' ', 
+                          ''.join(text_fragments).strip())
+            for row_offset in range(rowspan):
+                for column_offset in range(colspan):
+                    grid[(row_index + row_offset, 
+                          column_index + column_offset)] = text
+            column_index += colspan
+
+    table = [[] for row in parser.rows]
+    for (row_index, column_index), text in sorted(grid.items()):
+        if row_index < len(table):
+            table[row_index].append(text)
+
+    if len(table) <= 6:
+        raise ValueError("The observation table contains no data rows.")
+    header = table[2]
+    data_rows = table[3:-3]
+    if (('Date' not in header) or 
+        (len([column for column in header if 'Time' in column]) != 1) or
+        (len(set(header)) != len(header)) or 
+        (any(len(row) != len(header) for row in data_rows))):
+        raise ValueError("The observation table doesn't have the \
+expected layout.")
+    # Empty cells are stored as missing values (as they would be within
+    # pd.read_html()'s output):
+    return pd.DataFrame(data_rows, columns = header).replace('', np.nan)
+
+
+def read_observation_table(page_text):
+    '''Returns the observation table within page_text as a DataFrame.
+    extract_observation_table() is tried first, since it's faster and
+    doesn't require any additional libraries; if the table's layout 
+    has changed in a way that this function can't handle, 
+    pd.read_html() will be used instead.'''
+    try:
+        return extract_observation_table(page_text)
+    except ValueError as e:
+        print(f"Using pd.read_html() to read the observation table, \
+as the following error occurred: {e}")
+        # read_html returns a list of tables (even though only one 
+        # table is currently present on this site), so we'll use [0] to
+        # access that table.
+        # The final 3 rows are simply a repetition of the header, so I 
+        # added in [:-3] to exclude them from the DataFrame.
+        # header = 2 specifies that the third row in the DataFrame 
+        # should be used as a header. (The first two rows' values are 
+        # mostly duplicates of this row's data.)
+        return pd.read_html(io.StringIO(page_text), header = 2)[0][:-3]
+
+
+def weather_import_batch(station_list, data_folder = '', max_workers = 8,
+                         months_to_load = 3):
+    '''This function runs weather_import() for each station within 
+    station_list, then returns a dictionary whose keys are station 
+    codes and whose values are DataFrames containing each station's
+    historical data (including rolling precipitation totals and other
+    derived fields).
+
+    Most of the time needed to import a station's data is spent 
+    waiting for the NWS website to respond, so stations are processed 
+    concurrently within a pool of threads. (Each station's files are
+    only read and written by one thread, so the threads won't 
+    interfere with one another.)
+
+    max_workers: the maximum number of stations that will be processed
+    at the same time. Keeping this number fairly low (e.g. 8) will 
+    prevent the NWS's servers from receiving hundreds of requests at 
+    once when many stations are being imported.
+
+    months_to_load: the number of most recent months of data to return
+    for each station (see read_partitions()). Set to None to return 
+    each station's full history.
+
+    If a station's data can't be imported (e.g. because its page 
+    couldn't be reached), the other stations will still get processed
+    (and their new data will still get saved). Once all stations have
+    finished, a ValueError listing each station that failed, along 
+    with its error, will then be raised. (Returning a dictionary that
+    was missing these stations would instead cause a KeyError later 
+    on, once code that expected them tried to access their data.)'''
+    
+    # Creating a session whose connection pool is large enough for 
+    # each thread to reuse its own connection to the NWS website:
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections = 1, pool_maxsize = max_workers)
+    session.mount('https://', adapter)
+
+    def import_station(station_code):
+        weather_import(station_code, data_folder, session = session)
+        return load_weather_data(station_code, data_folder, months_to_load)
+
+    weather_data_dict = {}
+    # A dictionary of station codes and the errors that prevented 
+    # their data from being imported:
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(import_station, station_code):
+                   station_code for station_code in station_list}
+        for future in as_completed(futures):
+            station_code = futures[future]
+            try:
+                weather_data_dict[station_code] = future.result()
+            except Exception as e:
+                print(f"Data for {station_code} couldn't be imported \
+due to the following error: {e}")
+                errors[station_code] = e
+
+    if len(errors) > 0:
+        # Listing the failed stations in the same order as station_list:
+        failed_stations = [station_code for station_code in station_list
+                           if station_code in errors]
+        raise ValueError("Data for the following stations couldn't be \
+imported: " + '; '.join(
+            f'{station_code} ({errors[station_code]!r})' 
+            for station_code in failed_stations)) from errors[
+            failed_stations[0]]
+
+    # Returning the results in the same order as station_list:
+    return {station_code: weather_data_dict[station_code] 
+            for station_code in station_list}
+
+
+def create_history_folder(station_code, data_folder = ''):
+    '''Returns the path to the folder that stores historical data for
+    station_code (creating this folder if needed).'''
+    history_folder = os.path.join(data_folder, f'{station_code}_history')
+    os.makedirs(os.path.join(history_folder, 'raw'), exist_ok = True)
+    os.makedirs(os.path.join(history_folder, 'derived'), exist_ok = True)
+    return history_folder
+
+
+def list_partitions(folder):
+    '''Returns a chronologically sorted list of the monthly Parquet
+    files (e.g. '2025-03.parquet') within folder.'''
+    if not os.path.exists(folder):
+        return []
+    return sorted(file_name for file_name in os.listdir(folder) 
+                  if file_name.endswith('.parquet'))
+
+
+def prepare_for_parquet(df):
+    '''Converts all non-missing values within text columns to strings.
+    (Some NWS columns, such as 'Vis. (mi.)', can contain both numbers 
+    and text; Parquet files require each column to store only one
+    data type.)'''
+    df = df.copy()
+    for column in df.columns:
+        if df[column].dtype == 'object':
+            df[column] = df[column].where(
+                df[column].isna(), df[column].astype('str'))
+    return df
+
+
+def convert_to_text(values):
+    '''Converts all non-missing values within the Series values to 
+    strings. Missing values are kept as NaN.'''
+    return values.astype('str').where(values.notna())
+
+
+def upsert_partitions(df_new, folder, apply_schema = False):
+    '''This function adds the rows within df_new to the monthly Parquet 
+    files stored within folder. If a row for the same date and hour is
+    already present, the newer row will replace it. (As with the 
+    original .csv-based approach, only one result per date and hour is
+    retained; this allows rolling precipitation totals to assume that 
+    N rows of data represent N hours. At least one NWS station (KOKV)
+    reports recent weather data every 20 minutes; only one in three of
+    such reports will get retained. This also means that an hour of 
+    data will likely get lost when Daylight Savings Time ends.)
+
+    Only the files for months present within df_new are read and
+    rewritten. The function returns the number of rows within df_new
+    that were added or updated.
+
+    apply_schema: set to True to pass each month's data through 
+    apply_weather_schema() before it gets saved. (This is necessary for 
+    the derived dataset, as combining categorical columns with 
+    different categories will convert them back to strings.)'''
+    df_new = df_new.sort_values(['Date', 'Time']).drop_duplicates(
+        ['Date', 'Hour'], keep = 'last')
+    months = df_new['Date'].str[0:7] # E.g. '2025-03'
+
+    for month in months.unique():
+        partition_path = os.path.join(folder, f'{month}.parquet')
+        df_month = df_new[months == month]
+        if os.path.exists(partition_path):
+            df_month = pd.concat(
+                [pd.read_parquet(partition_path), df_month])
+            df_month.drop_duplicates(
+                ['Date', 'Hour'], keep = 'last', inplace = True)
+        df_month = df_month.sort_values(
+            ['Date', 'Time']).reset_index(drop=True)
+        # Writing to a temporary file, then renaming it, ensures that 
+        # an interrupted run won't leave a corrupted file behind.
+        temp_path = partition_path + '.tmp'
+        if apply_schema == True:
+            # Saving the file with an explicit schema (rather than 
+            # letting pyarrow infer one from this month's values) so 
+            # that every monthly file uses the same types:
+            df_month = apply_weather_schema(df_month)
+            pq.write_table(pa.Table.from_pandas(
+                df_month, schema = create_weather_schema(df_month.columns),
+                preserve_index = False), temp_path)
+        else:
+            prepare_for_parquet(df_month).to_parquet(
+                temp_path, index = False)
+        os.replace(temp_path, partition_path)
+
+    return len(df_new)
+
+
+def update_derived_partitions(station_code, data_folder = '', 
+                              df_new = None, lookback_rows = 24):
+    '''This function adds rolling precipitation totals and other 
+    derived fields (see derive_weather_fields()) to the rows within
+    df_new, then saves the results to monthly Parquet files within 
+    the station's 'derived' folder.
+
+    Rather than recalculating these fields for the station's entire
+    history, the function only processes the raw rows from the 
+    earliest row in df_new onward, along with the lookback_rows rows
+    that precede them. (These earlier rows are needed to calculate
+    24-hour rolling totals for the first new rows, but they don't
+    get saved again.)
+
+    If df_new is None, or if no derived data has been saved yet, 
+    the derived fields will instead be calculated for the full 
+    history. (This only needs to happen once.)'''
+    history_folder = create_history_folder(station_code, data_folder)
+    raw_folder = os.path.join(history_folder, 'raw')
+    derived_folder = os.path.join(history_folder, 'derived')
+
+    if (df_new is None) or (len(list_partitions(derived_folder)) == 0):
+        df_raw = read_partitions(raw_folder)
+        start_position = 0
+    else:
+        # Reading only the raw file for the month of the earliest new
+        # row, the file that precedes it (so that lookback rows at the 
+        # start of a month are available), and any later files:
+        first_key = (df_new['Date'] + ' ' + df_new['Time']).min()
+        partitions = list_partitions(raw_folder)
+        first_index = partitions.index(f'{first_key[0:7]}.parquet')
+        partitions = partitions[max(first_index - 1, 0):]
+        df_raw = pd.concat(
+            [pd.read_parquet(os.path.join(raw_folder, partition)) 
+             for partition in partitions], ignore_index = True)
+        df_raw = df_raw.sort_values(['Date', 'Time']).reset_index(
+            drop=True)
+        # Finding the position of the first new row within this sorted 
+        # table: (Since dates use a YYYY-MM-DD format and times use a 
+        # HH:MM format, these combined strings sort in chronological
+        # order.)
+        start_position = (df_raw['Date'] + ' ' + df_raw[
+            'Time']).searchsorted(first_key)
+
+    lookback_start = max(start_position - lookback_rows, 0)
+    df_derived = derive_weather_fields(df_raw.iloc[lookback_start:])
+    # Removing the lookback rows, whose derived values have already
+    # been saved:
+    df_derived = df_derived.iloc[start_position - lookback_start:]
+    upsert_partitions(df_derived, derived_folder, apply_schema = True)
+
+
+def read_partitions(folder, months_to_load = None):
+    '''Reads the monthly Parquet files within folder into a single
+    DataFrame.
+
+    months_to_load: the number of most recent monthly files to read.
+    (For example, 2 will read only the current and previous months' 
+    data.) Set to None to read all files.'''
+    partitions = list_partitions(folder)
+    if months_to_load is not None:
+        partitions = partitions[-months_to_load:]
+    return pd.concat(
+        [pd.read_parquet(os.path.join(folder, partition)) 
+         for partition in partitions], ignore_index = True)
+
+
+def load_raw_weather_data(station_code, data_folder = '', 
+                          months_to_load = None):
+    '''Reads the historical data for station_code into a single
+    DataFrame. See read_partitions() for an explanation of 
+    months_to_load.'''
+    return read_partitions(os.path.join(
+        data_folder, f'{station_code}_history', 'raw'), months_to_load)
+
+
+def load_weather_data(station_code, data_folder = '', 
+                      months_to_load = None):
+    '''Reads the historical data for station_code, including the
+    additional fields (e.g. rolling precipitation totals and 
+    windspeed) that were previously saved within 
+    {station_code}_historical_hourly_data_updated.csv. 
+    See read_partitions() for an explanation of months_to_load.
+    '''
+    derived_folder = os.path.join(
+        data_folder, f'{station_code}_history', 'derived')
+    # Creating the derived dataset if it doesn't exist yet:
+    if len(list_partitions(derived_folder)) == 0:
+        update_derived_partitions(station_code, data_folder)
+    partitions = list_partitions(derived_folder)
+    if months_to_load is not None:
+        partitions = partitions[-months_to_load:]
+    # Since each derived file uses the same schema, the files can be 
+    # combined as Arrow tables before being converted to a single 
+    # DataFrame. (This is faster than combining separate DataFrames,
+    # and it also merges each file's set of categories, which 
+    # pd.concat() would convert back to strings.) 
+    # promote_options = 'permissive' allows files with missing columns
+    # to be combined with other files.
+    return pa.concat_tables(
+        [read_derived_partition(os.path.join(derived_folder, partition)) 
+         for partition in partitions], 
+        promote_options = 'permissive').to_pandas()
+
+
+def read_derived_partition(partition_path):
+    '''Reads a monthly file from the derived weather dataset as an 
+    Arrow table that uses the types within DERIVED_COLUMN_TYPES.
+    Files saved by earlier versions of this script (whose types were
+    inferred from each month's values) will be converted to these 
+    types after they're read.'''
+    table = pq.read_table(partition_path)
+    schema = create_weather_schema(table.column_names)
+    if table.schema.equals(schema) == False:
+        table = pa.Table.from_pandas(
+            apply_weather_schema(table.to_pandas()), schema = schema,
+            preserve_index = False)
+    return table
+
+
+def derive_weather_fields(df_wx):
+    '''This function converts several columns within a table of raw
+    NWS observations to numeric values; renames certain columns; and 
+    adds rolling precipitation totals, windspeed values, and a
+    'Date/Time' column.'''
+    df_wx = df_wx.copy()
 
     # Removing percentages from Relative Humidity column so that these
     # values can be converted to floats:
@@ -225,16 +774,14 @@ _historical_hourly_data.csv', index = False)
         column].fillna(0).copy()
        
     # Adding 'Precip' prefixes to the hourly precipitation rows; making the 
-    # temperature and dew point column names more intuitive; and removing
-    # time zone data from the time field:
+    # temperature and dew point column names more intuitive:
     df_wx.rename(columns = {
         '1 hr':'1-Hour Precip',
         '3 hr':'3-Hour Precip',
         '6 hr':'6-Hour Precip',
         'Air':'Temp',
         'Dwpt':'Dew Point',
-        'altimeter (in)':'Altimeter (in.)',
-    original_time_col:'Time'},
+        'altimeter (in)':'Altimeter (in.)'},
          inplace = True)
     
     # Sorting the table in chronological order:
@@ -271,6 +818,10 @@ _historical_hourly_data.csv', index = False)
 
     df_wx['Windspeed'] = np.where(df_wx['Wind (mph)'] == 'Calm',
                                   0, df_wx['Windspeed'])
+    # Converting these windspeeds to numbers so that they can be 
+    # stored within a numeric Parquet column:
+    df_wx['Windspeed'] = pd.to_numeric(df_wx['Windspeed'], 
+                                       errors = 'coerce')
     
     # Removing the 6-hour max and min temperature columns in order to 
     # simplify the table:
@@ -281,9 +832,64 @@ _historical_hourly_data.csv', index = False)
     df_wx.insert(
         2, 'Date/Time', df_wx['Date'].astype('str') 
         + ' ' + df_wx['Time'].astype('str'))
-    
-    # Saving this revised dataset to a .csv file so that it can be 
-    # visualized and shared with others:
 
-    df_wx.to_csv(f'{data_folder}{post_folder_char}\
-{station_code}_historical_hourly_data_updated.csv', index = False)
+    # Adding a timezone-aware version of this column: (This column will
+    # allow observations from stations in different time zones, or 
+    # observations taken before and after a Daylight Savings Time 
+    # change, to be compared correctly.)
+    utc_offsets = df_wx['Time Zone'].map(TIME_ZONE_OFFSETS)
+    df_wx.insert(3, 'Timestamp (UTC)', (
+        pd.to_datetime(df_wx['Date/Time'], format = '%Y-%m-%d %H:%M') 
+        - pd.to_timedelta(utc_offsets, unit = 'h')).dt.tz_localize('UTC'))
+
+    return apply_weather_schema(df_wx)
+
+
+def apply_weather_schema(df_wx):
+    '''This function converts the columns within a derived weather 
+    dataset (see derive_weather_fields()) to the data types listed 
+    within DERIVED_COLUMN_TYPES. These types allow multi-year, 
+    multi-station datasets to be stored and loaded much more 
+    efficiently. (Date and Time are kept as strings, since they're 
+    used to organize the dataset's monthly files.)
+
+    Each column will receive the same type regardless of its contents.
+    For instance, a 'Weather' column without any values will still be
+    stored as a category with string values, and visibility readings
+    will be stored as strings even if none of them contain text.
+
+    Running this function on a dataset that already uses these types
+    won't change its contents.'''
+    df_wx = df_wx.copy()
+    for column in df_wx.columns:
+        column_type = DERIVED_COLUMN_TYPES.get(column, 'string')
+        if column_type == 'string':
+            df_wx[column] = convert_to_text(df_wx[column])
+        elif column_type == 'category':
+            values = convert_to_text(df_wx[column])
+            # Specifying the categories (rather than letting pandas
+            # infer them) ensures that they'll be stored as strings
+            # even when the column is empty:
+            df_wx[column] = pd.Categorical(values, categories = pd.Index(
+                sorted(values.dropna().unique()), dtype = 'str'))
+        elif column_type == 'float32':
+            df_wx[column] = pd.to_numeric(
+                df_wx[column], errors = 'coerce').astype('float32')
+        elif column_type == 'datetime':
+            # 'Date/Time' stores each observation's local time (as
+            # shown on the NWS's website); 'Timestamp (UTC)' stores 
+            # the same time in UTC.
+            df_wx[column] = pd.to_datetime(df_wx[column])
+        elif column_type == 'datetime_utc':
+            df_wx[column] = pd.to_datetime(df_wx[column], utc = True)
+        else:
+            df_wx[column] = df_wx[column].astype(column_type)
+    return df_wx
+
+
+def create_weather_schema(columns):
+    '''Returns the Parquet (Arrow) schema that corresponds to
+    DERIVED_COLUMN_TYPES for the specified list of columns.'''
+    return pa.schema(
+        [(column, ARROW_TYPES[DERIVED_COLUMN_TYPES.get(column, 'string')]) 
+         for column in columns])